@@ -0,0 +1,60 @@
+import argparse
+import glob
+import io
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from prospectus import normalize_html
+from file_reader import read_document
+
+def regex_sweeps(html_content):
+    # The four full-document passes normalize_html replaced, kept here as the baseline
+    html_content = re.sub(r'<!--.*?-->', '', html_content, flags=re.DOTALL)
+    html_content = re.sub(r'<[^>]+>', lambda match: match.group(0).lower(), html_content)
+    html_content = re.sub(r'<!doctype[^>]*>', lambda match: match.group(0).upper(), html_content)
+    html_content = re.sub(r'<!doctype[^>]*>(.*)', r'<!DOCTYPE \1>', html_content)
+    return html_content
+
+def sample_corpus(pattern, sample, seed):
+    files = sorted(glob.glob(pattern))
+    if not files:
+        raise SystemExit(f'No files match {pattern}, pass --pattern')
+    random.Random(seed).shuffle(files)
+    return files[:sample]
+
+def time_it(fn, documents):
+    start = time.perf_counter()
+    for document in documents:
+        fn(document)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the regex sweeps and the single pass html normaliser in MB/s')
+    parser.add_argument('--pattern', default='./data/sec-ipo-files/*/*.htm*', help='glob of prospectus html files')
+    parser.add_argument('--sample', type=int, default=50, help='number of files to sample')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    documents = []
+    for file_path in sample_corpus(args.pattern, args.sample, args.seed):
+        documents.append(read_document(file_path))
+    megabytes = sum(len(document) for document in documents) / 1e6
+
+    mismatches = sum(regex_sweeps(document) != normalize_html(document) for document in documents)
+    print(f'{len(documents)} files, {megabytes:.1f} MB, {mismatches} outputs differ')
+
+    # Same buffer reused for every document, as a streaming caller would
+    buffer = io.StringIO()
+    def into_buffer(document):
+        buffer.seek(0)
+        buffer.truncate()
+        normalize_html(document, buffer)
+
+    for name, fn in [('regex sweeps', regex_sweeps), ('single pass', normalize_html), ('single pass, buffer', into_buffer)]:
+        print(f'{name:<20} {megabytes / time_it(fn, documents):>8.1f} MB/s')
+
+main()
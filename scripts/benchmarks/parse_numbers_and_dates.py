@@ -0,0 +1,45 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from utils import format_dates, format_numbers, regex_format_date, regex_format_number
+
+def find_combined_csv():
+    files = sorted(glob.glob('./data/sec-ipo-finance/*/combined.csv'))
+    if not files:
+        raise SystemExit('No combined.csv found under ./data/sec-ipo-finance, pass --file')
+    return files[0]
+
+def load_cells(file_path, repeat):
+    # Every cell of the table as one long Series, repeated so timings are not lost in noise
+    df = pd.read_csv(file_path, quotechar='"', low_memory=False)
+    cells = pd.Series(df.to_numpy(dtype=object).ravel(), dtype=object)
+    return pd.concat([cells] * repeat, ignore_index=True)
+
+def time_it(fn, cells):
+    start = time.perf_counter()
+    fn(cells)
+    return time.perf_counter() - start
+
+def report(name, per_cell, vectorized, n_cells):
+    print(f'{name:<8} per-cell {n_cells / per_cell:>12,.0f} cells/s   '
+          f'vectorized {n_cells / vectorized:>12,.0f} cells/s   speedup {per_cell / vectorized:.1f}x')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-cell and vectorized number/date parsing on a combined.csv')
+    parser.add_argument('--file', default=None, help='combined.csv to read, defaults to the first one found')
+    parser.add_argument('--repeat', type=int, default=20, help='how many times to repeat the cells')
+    args = parser.parse_args()
+
+    file_path = args.file or find_combined_csv()
+    cells = load_cells(file_path, args.repeat)
+    print(f'{file_path}: {len(cells):,} cells')
+
+    report('numbers', time_it(lambda c: c.map(regex_format_number), cells), time_it(format_numbers, cells), len(cells))
+    report('dates', time_it(lambda c: c.map(regex_format_date), cells), time_it(format_dates, cells), len(cells))
+
+main()
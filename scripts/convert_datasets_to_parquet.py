@@ -0,0 +1,41 @@
+import argparse
+import glob
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from storage import HAS_PYARROW, dataset_path, read_dataset, write_dataset
+
+DEFAULT_PATTERNS = [
+    './datasets/*.csv',
+    './data/*.csv',
+    './data/sec-ipo-finance/*/*.csv',
+]
+
+def convert(csv_path, force=False):
+    parquet_path = dataset_path(csv_path, 'parquet')
+    if not force and os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+        return False
+
+    df = read_dataset(csv_path)
+    if df is None:
+        return False
+    write_dataset(df, csv_path)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert existing csv datasets to parquet next to the csv')
+    parser.add_argument('patterns', nargs='*', default=DEFAULT_PATTERNS, help='glob patterns of csv files to convert')
+    parser.add_argument('--force', action='store_true', help='convert even when the parquet copy is up to date')
+    args = parser.parse_args()
+
+    if not HAS_PYARROW:
+        raise SystemExit('pyarrow is not installed, nothing to convert to')
+
+    converted = 0
+    for pattern in args.patterns:
+        for csv_path in sorted(glob.glob(pattern)):
+            converted += convert(csv_path, args.force)
+    print(f'Converted {converted} csv files to parquet')
+
+main()
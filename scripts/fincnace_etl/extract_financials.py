@@ -1,6 +1,10 @@
 import os
+import sys
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from process_html import build_keyword_matcher
+
 
 finance_keywords= ['Revenue', 'Accounts Receivable', 'Liabilities', 'Assets', 'Cash', 'Common Stock', 'Differed Tax', 'Inventory', 'Earnings', 'Operating Loss', 'Months Ended', 'Year Ended', 'Depreciation']
 column_keywords = ['Six Months End', 'Twelve Months End', 'Year Ended', 'Six Months Ended', 'Twelve Months Ended', 'Years Ended', 'Years End', 'Period From']
@@ -23,17 +27,21 @@ def extract_table_data(file_path):
         df = None
     return df
 
+# Same cached alternation process_html matches its finance tables with
+finance_keyword_matcher = build_keyword_matcher(tuple(finance_keywords))
+
 def find_finance_tables(df):
     all_dfs = []
 
     for item in df:
-        for w in finance_keywords:
-            exists = item.astype(str).apply(lambda x: x.str.contains(w, case=False, na=False)).any().any()
-            if exists:
-                is_small = item.shape[0] < 4
-                if is_small:
-                    continue
-                all_dfs.append(item) 
+        is_small = item.shape[0] < 4
+        if is_small:
+            continue
+
+        # Flatten every cell into one string and scan it once
+        table_text = '\n'.join(map(str, item.to_numpy().ravel()))
+        if finance_keyword_matcher.search(table_text):
+            all_dfs.append(item)
 
     return all_dfs
 
@@ -1,5 +1,12 @@
+import argparse
+import os
+import numpy as np
 import pandas as pd
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from storage import dataset_exists, existing_dataset_path, read_dataset, write_dataset
 
 DATE_PATTERNS = [
     # Standard numeric formats
@@ -161,10 +168,9 @@ def filter_important_rows(df):
 # First: Take the combined.csv file and clean out columns and rows -> combined_clean_01.csv
 # Note: The combined.csv file was generated during the extraction script
 def clean_out_columns_and_rows(file_path):
-    try:
-        df = pd.read_csv(file_path, low_memory=False)
-    except FileNotFoundError:
-        return None 
+    df = read_dataset(file_path)
+    if df is None:
+        return None
 
     for i,col in enumerate(df.columns):
         if i == 0:
@@ -194,10 +200,9 @@ def is_date_in_row(row):
 
 # Second: Locate the value and date from combined_clean_01 -> combined_clean_02
 def locate_value_and_date(file_path):
-    try:
-        df = pd.read_csv(file_path, low_memory=False)
-    except FileNotFoundError:
-        return None 
+    df = read_dataset(file_path)
+    if df is None:
+        return None
 
     new_rows = []
     column_dates = [None] * len(df.columns)
@@ -263,11 +268,8 @@ def locate_value_and_date(file_path):
 
 # Third: Take the combined_clean_02.csv file and format it -> combined_clean_03.csv
 def format_and_filter_rows(file_path):
-    try:
-        df = pd.read_csv(file_path, low_memory=False)
-    except FileNotFoundError:
-        return None 
-    except Exception as e:
+    df = read_dataset(file_path)
+    if df is None:
         return None
     
     if df.columns.size == 0:
@@ -279,39 +281,28 @@ def format_and_filter_rows(file_path):
 
 # Fourth: Calculate trend and recent
 def calculate_trend_and_recent(file_path):
-    try:
-        df = pd.read_csv(file_path, low_memory=False)
-    except FileNotFoundError:
-        return None 
-    except Exception as e:
+    df = read_dataset(file_path)
+    if df is None:
         return None
 
-    new_df = pd.DataFrame() 
-    for name, group in df.groupby('symbol'):
-        first_value = group['value'].iloc[0]
-        last_value = group['value'].iloc[-1]
-        diff = last_value - first_value
-
-        new_trend_row = pd.DataFrame({
-            'symbol': f'{name}_trend',
-            'value': [diff]
-        })
-        new_recent_row = pd.DataFrame({
-            'symbol': f'{name}_recent',
-            'value': [last_value]
-        })
-
-        new_df = pd.concat([new_df, new_trend_row, new_recent_row], ignore_index=True)
-    
+    # Rows are sorted by symbol and date, so first and last appearance are the oldest and newest values
+    df = df.dropna(subset=['symbol'])
+    first_value = df.drop_duplicates('symbol', keep='first').set_index('symbol')['value'].sort_index()
+    last_value = df.drop_duplicates('symbol', keep='last').set_index('symbol')['value'].sort_index()
+    diff = last_value - first_value
+
+    # One trend row then one recent row per symbol
+    new_df = pd.DataFrame({
+        'symbol': [f'{name}_{feature}' for name in last_value.index for feature in ('trend', 'recent')],
+        'value': np.column_stack([diff.to_numpy(), last_value.to_numpy()]).ravel()
+    })
+
     return new_df
 
 # Fifth: Pivot tables from other steps
 def pivot_df(file_path):
-    try:
-        df = pd.read_csv(file_path, low_memory=False)
-    except FileNotFoundError:
-        return None 
-    except Exception as e:
+    df = read_dataset(file_path)
+    if df is None:
         return None
 
     current_cols = df.set_index('symbol')['value']
@@ -321,72 +312,56 @@ def pivot_df(file_path):
     return result
 
 def combine_pivot_tables(file_path, accumulating_df):
-    try:
-        df = pd.read_csv(file_path, low_memory=False)
-    except FileNotFoundError:
-        return None 
-    except Exception as e:
-        return None 
+    df = read_dataset(file_path)
+    if df is None:
+        return None
 
     accumulating_df = pd.concat([accumulating_df, df], axis=1)
 
     return accumulating_df
 
-def step_one():
-    ipo_df = pd.read_csv('./datasets/keyword_analysis_with_url.csv')
-    ipo_df = ipo_df[['symbol']]
+def is_stale(input_path, output_path):
+    # Make-style check: rebuild when the input exists and the output is missing or older than it
+    input_path = existing_dataset_path(input_path)
+    output_path = existing_dataset_path(output_path)
+    if input_path is None:
+        return False
+    return output_path is None or os.path.getmtime(output_path) < os.path.getmtime(input_path)
 
+def run_file_step(step, input_name, output_name, incremental=False):
+    ipo_df = read_dataset('./datasets/keyword_analysis_with_url', columns=['symbol'])
+
+    rebuilt = 0
     for tuple in list(ipo_df.itertuples(index=False)):
         # Extract file coordinates
         dir_name=tuple[0]
-        file_path= f'./data/sec-ipo-finance/{dir_name}/financial/combined.csv';
-        df = clean_out_columns_and_rows(file_path)
-        if df is None:
+        file_path= f'./data/sec-ipo-finance/{dir_name}/financial/{input_name}'
+        output_path = f'./data/sec-ipo-finance/{dir_name}/financial/{output_name}'
+        if incremental and not is_stale(file_path, output_path):
             continue
-        df.to_csv(f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_01.csv', index=False)
 
-def step_two():
-    ipo_df = pd.read_csv('./datasets/keyword_analysis_with_url.csv')
-    ipo_df = ipo_df[['symbol']]
-
-    for tuple in list(ipo_df.itertuples(index=False)):
-        # Extract file coordinates
-        dir_name=tuple[0]
-        file_path= f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_01.csv';
-        df = locate_value_and_date(file_path)
+        df = step(file_path)
         if df is None:
-            print(f'df not made {dir_name}')
             continue
-        df.to_csv(f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_02.csv', index=False)
+        write_dataset(df, output_path)
+        rebuilt += 1
 
-def step_three():
-    ipo_df = pd.read_csv('./datasets/keyword_analysis_with_url.csv')
-    ipo_df = ipo_df[['symbol']]
+    print(f'{output_name}: rebuilt {rebuilt} files')
 
-    for tuple in list(ipo_df.itertuples(index=False)):
-        # Extract file coordinates
-        dir_name=tuple[0]
-        file_path= f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_02.csv';
-        df = format_and_filter_rows(file_path)
-        if df is None:
-            continue
-        df.to_csv(f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_03.csv', index=False)
+def step_one(incremental=False):
+    run_file_step(clean_out_columns_and_rows, 'combined.csv', 'combined_clean_01.csv', incremental)
 
-def step_four():
-    ipo_df = pd.read_csv('./datasets/keyword_analysis_with_url.csv')
-    ipo_df = ipo_df[['symbol']]
+def step_two(incremental=False):
+    run_file_step(locate_value_and_date, 'combined_clean_01.csv', 'combined_clean_02.csv', incremental)
 
-    for tuple in list(ipo_df.itertuples(index=False)):
-        # Extract file coordinates
-        dir_name=tuple[0]
-        file_path= f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_03.csv';
-        df = calculate_trend_and_recent(file_path)
-        if df is None:
-            continue
-        df.to_csv(f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_04.csv', index=False)
+def step_three(incremental=False):
+    run_file_step(format_and_filter_rows, 'combined_clean_02.csv', 'combined_clean_03.csv', incremental)
 
-def step_five():
-    ipo_df = pd.read_csv('./datasets/keyword_analysis_with_url.csv')
+def step_four(incremental=False):
+    run_file_step(calculate_trend_and_recent, 'combined_clean_03.csv', 'combined_clean_04.csv', incremental)
+
+def step_five(incremental=False):
+    ipo_df = read_dataset('./datasets/keyword_analysis_with_url')
 
     for tuple_row in list(ipo_df.itertuples(index=False)):
         # Convert tuple to dictionary
@@ -395,6 +370,10 @@ def step_five():
         # Extract file coordinates
         dir_name = row_dict['symbol']  # or whatever column contains the directory name
         file_path = f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_04.csv'
+        output_path = f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_05.csv'
+        if incremental and not is_stale(file_path, output_path):
+            continue
+
         df = pivot_df(file_path)
         
         if df is None:
@@ -404,38 +383,49 @@ def step_five():
         for col_name, value in row_dict.items():
             df[col_name] = value
 
-        df.to_csv(f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_05.csv', index=False)
+        write_dataset(df, output_path)
+
+def step_six(incremental=False):
+    ipo_df = read_dataset('./datasets/keyword_analysis_with_url', columns=['symbol'])
+    output_path = './data/all_financial'
 
-def step_six():
-    ipo_df = pd.read_csv('./datasets/keyword_analysis_with_url.csv')
-    ipo_df = ipo_df[['symbol']]
+    # Incremental runs only re-read the symbols whose pivot is newer than the combined file
+    existing_df = None
+    if incremental and dataset_exists(output_path):
+        existing_df = read_dataset(output_path)
 
     all_dfs = []
+    changed_symbols = []
     for tuple in list(ipo_df.itertuples(index=False)):
         # Extract file coordinates
         dir_name=tuple[0]
         file_path= f'./data/sec-ipo-finance/{dir_name}/financial/combined_clean_05.csv';
-        try:
-            df = pd.read_csv(file_path, low_memory=False)
-        except FileNotFoundError:
-            continue
-        except Exception as e:
+        if existing_df is not None and not is_stale(file_path, output_path):
             continue
+        df = read_dataset(file_path)
         if df is None:
             continue
 
         all_dfs.append(df)
+        changed_symbols.append(dir_name)
+
+    if existing_df is not None:
+        keep = ~existing_df['symbol'].isin(changed_symbols) & existing_df['symbol'].isin(ipo_df['symbol'])
+        all_dfs.insert(0, existing_df[keep])
+        print(f'all_financial: replacing rows for {len(changed_symbols)} symbols')
 
     all_dfs = pd.concat(all_dfs, axis=0)
-    all_dfs.to_csv(f'./data/all_financial.csv', index=False)
+    write_dataset(all_dfs, output_path)
 
 def main():
-    # step_one()
-    # step_two()
-    # step_three()
-    # step_four()
-    # step_five()
-    step_six()
+    parser = argparse.ArgumentParser(description='Transform extracted finance tables into ./data/all_financial.csv')
+    parser.add_argument('--steps', type=int, nargs='+', default=[1, 2, 3, 4, 5, 6], help='which steps to run, in order')
+    parser.add_argument('--incremental', action='store_true', help='only rebuild files whose input is newer than their output')
+    args = parser.parse_args()
+
+    steps = [step_one, step_two, step_three, step_four, step_five, step_six]
+    for step in args.steps:
+        steps[step - 1](incremental=args.incremental)
 
 main()
 
@@ -1,34 +1,182 @@
 import pandas as pd
+import argparse
+import json
 import shutil
+import subprocess
+import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def try_to_copy_file(dir_name, file_name):
-    possible_parent_dirs=['sec-ipo-prospectus', 'sec-ipo-prospectus-2', 'sec-ipo-prospectus-3', 'sec-ipo-prospectus-4', 'sec-ipo-prospectus-5']
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from corpus_index import CorpusIndex
 
-    for p_dir in possible_parent_dirs:
-        # Check which parent has the file
-        file_path=f'/Volumes/Shared/sec-ipo-data/{p_dir}/{dir_name}/{file_name}'
-        does_exist = os.path.exists(file_path)
+SOURCE_ROOT = '/Volumes/Shared/sec-ipo-data'
+# Searched in this order, the first parent holding a file wins
+SOURCE_DIRS = ['sec-ipo-prospectus', 'sec-ipo-prospectus-2', 'sec-ipo-prospectus-3', 'sec-ipo-prospectus-4', 'sec-ipo-prospectus-5']
+INDEX_PATH = './data/source_index.json'
+DESTINATION_ROOT = './data/sec-ipo-files'
 
-        if does_exist:
-            destination_dir=f"./data/sec-ipo-files/{dir_name}/"
-            destination_file=f'{destination_dir}/{file_name}'
-            os.makedirs(os.path.dirname(destination_dir), exist_ok=True)
-            shutil.copy(file_path, destination_file)
-            return
+def scan_source_dir(source_dir):
+    # One scandir pass per tree, sizes and mtimes come with the directory listing instead of a probe per file
+    files = {}
+    with os.scandir(source_dir) as symbol_entries:
+        for symbol_entry in symbol_entries:
+            if not symbol_entry.is_dir():
+                continue
+            with os.scandir(symbol_entry.path) as file_entries:
+                for file_entry in file_entries:
+                    if file_entry.is_file():
+                        stat = file_entry.stat()
+                        files.setdefault(symbol_entry.name, {})[file_entry.name] = [file_entry.path, stat.st_size, stat.st_mtime_ns]
+    return files
 
+def build_source_index(source_root=SOURCE_ROOT, source_dirs=SOURCE_DIRS):
+    index = {}
+    for p_dir in source_dirs:
+        source_dir = os.path.join(source_root, p_dir)
+        if not os.path.isdir(source_dir):
+            print(f'Source not found: {source_dir}')
+            continue
+        for symbol, files in scan_source_dir(source_dir).items():
+            symbol_files = index.setdefault(symbol, {})
+            for file_name, entry in files.items():
+                symbol_files.setdefault(file_name, entry)
+    return index
+
+def load_source_index(source_root=SOURCE_ROOT, refresh=False, path=INDEX_PATH, source_dirs=SOURCE_DIRS):
+    # The cached index is only reused for the same source trees, a different root rebuilds it
+    if not refresh and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            cached = json.load(file)
+        if cached.get('source_root') == source_root and cached.get('source_dirs') == list(source_dirs):
+            return cached['files']
+        print(f'{path} was built for other source trees, rescanning {source_root}')
+
+    start = time.perf_counter()
+    index = build_source_index(source_root, source_dirs)
+    print(f'Indexed {sum(len(files) for files in index.values())} files in {time.perf_counter() - start:.1f}s')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({'source_root': source_root, 'source_dirs': list(source_dirs), 'files': index}, file)
+    os.replace(tmp_path, path)
+    return index
+
+def is_up_to_date(destination_file, size, mtime_ns):
+    try:
+        stat = os.stat(destination_file)
+    except FileNotFoundError:
+        return False
+    return stat.st_size == size and stat.st_mtime_ns == mtime_ns
+
+def reflink(source_file, destination_file):
+    # Copy-on-write clone: clonefile on macOS, FICLONE on Linux
+    flag = '-c' if sys.platform == 'darwin' else '--reflink=always'
+    subprocess.run(['cp', flag, '-p', source_file, destination_file], check=True, capture_output=True)
+
+def place_file(source_file, destination_file, link):
+    """Put the source at the destination by hard link, reflink or copy, falling back to a copy when
+    the two are on different filesystems. Returns how the file got there."""
+    tmp_path = f'{destination_file}.tmp'
+    if link == 'hardlink':
+        try:
+            if os.path.exists(destination_file):
+                os.remove(destination_file)
+            os.link(source_file, destination_file)
+            return 'linked'
+        except OSError:
+            pass
+    elif link == 'reflink':
+        try:
+            reflink(source_file, tmp_path)
+            os.replace(tmp_path, destination_file)
+            return 'linked'
+        except (OSError, subprocess.CalledProcessError):
+            pass
+
+    # copy2 keeps the mtime, so the next run can tell the file is already in place
+    shutil.copy2(source_file, tmp_path)
+    os.replace(tmp_path, destination_file)
+    return 'copied'
+
+def gather_file(dir_name, file_name, entry, link):
+    # The index only says where the file lives, whether the copy is current is checked against the
+    # source as it is now, a file rewritten on the share since the index was built is copied again
+    source_file = entry[0]
+    try:
+        stat = os.stat(source_file)
+    except FileNotFoundError:
+        return 'missing', 0
+    size = stat.st_size
+
+    destination_file = f'{DESTINATION_ROOT}/{dir_name}/{file_name}'
+    if is_up_to_date(destination_file, size, stat.st_mtime_ns):
+        return 'skipped', 0
+
+    os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+    return place_file(source_file, destination_file, link), size
+
+def safe_gather_file(dir_name, file_name, entry, link):
+    try:
+        return dir_name, *gather_file(dir_name, file_name, entry, link), None
+    except Exception as e:
+        return dir_name, 'failed', 0, f'{type(e).__name__}: {e}'
+
+def gather_files(rows, index, workers, link=None):
+    outcomes = {'copied': 0, 'linked': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+    bytes_done = 0
+    start = time.perf_counter()
+
+    jobs = []
+    # A filing listed twice would have two threads writing the same destination
+    for dir_name, file_name in dict.fromkeys(rows):
+        entry = index.get(dir_name, {}).get(file_name)
+        if entry is None:
+            outcomes['missing'] += 1
+            continue
+        jobs.append((dir_name, file_name, entry))
+
+    # Threads, not processes: the work is waiting on the share, not the cpu
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(safe_gather_file, dir_name, file_name, entry, link) for dir_name, file_name, entry in jobs]
+        for future in as_completed(futures):
+            dir_name, outcome, size, error = future.result()
+            outcomes[outcome] += 1
+            bytes_done += size
+            if error is not None:
+                print(f'Failed on {dir_name}: {error}')
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(', '.join(f'{count} {outcome}' for outcome, count in outcomes.items()))
+    if outcomes['missing'] or outcomes['failed']:
+        print(f'Files added to or moved on the share since {INDEX_PATH} was built are picked up with --refresh-index')
+    print(f'Transferred {bytes_done / 1e6:.1f} MB in {elapsed:.1f}s, {bytes_done / 1e6 / elapsed:.2f} MB/s')
+    return outcomes
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Gather the ipo prospectus files from the shared sec-ipo-data trees')
+    parser.add_argument('--workers', type=int, default=16, help='concurrent copies, sized for the network share')
+    parser.add_argument('--link', choices=['hardlink', 'reflink'], default=None, help='link instead of copying when the source is on the same filesystem')
+    parser.add_argument('--refresh-index', action='store_true', help=f'rescan the source trees instead of using {INDEX_PATH}')
+    parser.add_argument('--source-root', default=SOURCE_ROOT, help='directory holding the sec-ipo-prospectus trees')
+    args = parser.parse_args()
+
     # Get all symbols and last part of url to find files
     df = pd.read_csv('./data/ipo_day_summary.csv')
 
     df = df[['symbol', 'url']]
     df['url'] = df['url'].apply(lambda x: x.split('/')[-1])
-    
-    for tuple in list(df.itertuples(index=False)):
-        dir_name=tuple[0]
-        file_name=tuple[1]
-        try_to_copy_file(dir_name, file_name)
 
-main()
\ No newline at end of file
+    index = load_source_index(args.source_root, refresh=args.refresh_index)
+    rows = [(tuple[0], tuple[1]) for tuple in df.itertuples(index=False)]
+    gather_files(rows, index, args.workers, args.link)
+
+    # Only the gathered files that are new or changed get re-read
+    with CorpusIndex(build=False) as corpus:
+        corpus.update()
+
+if __name__ == '__main__':
+    main()
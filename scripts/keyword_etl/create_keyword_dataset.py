@@ -1,31 +1,52 @@
+import argparse
 import os
+import re
+import sys
 import pandas as pd
 
-columns_to_remove=[
-    'Incorporated', 'LLP', 'Voting', 'Crime', 'Shareholder', 'Rights', 'Flows', 'CEO', 'Vehicle', 'CFO', 'COO', 'Worldwide', 'Party', 'Related', 'U.S.', 'Exclusive', 'Form', 'Forum', 'Nasdaq', 'NYSE', 'Listing', 'Only', 'Purchasers', 'Exempts', "Investors", 'Investor' 'Accounting',
-    'Bulletin', 'Applied', 'Limited', 'Molecular', 'Gigabit', 'Adjusted', 'EBITDA', 'Export', 'Control', 'Electronics', 'Engineers', 'Deferred', 'Nonqualified', 'Probability', 'Scenario', 'Google', 'Fiber', 'Gb', 'Ethernet', 'Beta', 'Gamma', 'Sigma',
-    'Automotive', 'Auto', 'Optical', 'Active', 'Texas', 'College', 'Participation', 'Plan', 'Incentive', 'Lease', 'Yard', 'Restaurant', 'Reason', 'Pacific', "Good", 'Great', 'Relationships', 'Certain', 'Electronic', 'Backup', 'Withholding', 'Investments', 'Joint', 'Trend',
-    'Motor', 'Boys', 'Mountain', 'Lookout', 'Mr.', 'Mrs.', 'Owner', 'Trademark', 'Parties', 'Consent', 'Written', 'Sponsorship', 'Sponsorships', 'Retail', 'Properties', 'Average', 'Attorney', 'Attorneys', 'Horizons', 'Surgery', 'Plastic', "Steak", 'Downtown', 'Trolley', 'Shopping',
-    'Salary', 'Base', "Award", 'Awards', 'Liquidations', 'Distributions', 'Penalty', 'Bids', "Balance", 'Sheets', 'Note', 'Landmark', 'Hotel', 'Hotels', 'Admin', 'Administration', 'Drug', 'Option', 'Share', "Sphere", 'Adaptive', 'Biotechnologies', 'Biologics', 'Biology', 'Harbour', 'No',
-    'Patent', 'Release', 'Pay', 'Payment', 'Payments', 'Royalty', 'Biotech', 'Genome', 'Brain', 'Search', 'Deep', 'Antibodies', 'Responses', 'Find', 'Natural', 'View', 'Detailed', 'Cell', 'Cells', 'Human', 'Immune', 'License', 'Emergency', 'Therapeutics', 'Pharma', 'Pharmaceuticals', 'Cancer',
-    'Series', 'Financial', 'Instruments', 'Improvements', 'Features', 'Part', 'Liquidation', 'Preference', 'Preferences', 'Officer', 'Scientific', 'Science', 'Industry', 'Opportunities', 'Drugs', 'Quant', 'Quanta', 'Compute', 'Computing', 'Computer', 'Parkway', 'Stockholder', 'Proposals', 'Proposal',
-    'Embassy', 'Accounts', 'Receivable', 'Cash', 'Tourism', 'Commission', 'Republic', 'Banana', 'Barn', 'Pottery', 'Store', 'Home', 'Express', 'Juice', 'Dress', 'Square', 'Feet', 'Crab', 'Tea', 'Salsa', 'Fresh', 'Refining', 'Refinery', 'Taco', 'Outlet', 'Grocery', 'Old', 'PCS', 'Sprint',
-    'Experience', 'Experiences', 'Showed', 'Street', 'Beach', 'Airbnb', 'Nationals', 'Specially', 'Designated', 'Tourism', 'Council', 'Hurricane', 'Open', 'Booked', 'Night', 'Stays', 'Cash', 'Free', 'Flow', 'Retained', 'Inventory', 'Resale', 'Restriction', 'Restrictions', 'Santa', 'Biosciences',
-    'Geographic', 'Discover', 'Retain', 'Guests', 'Web', 'Amazon', 'Project', 'Regulatory', 'Fine', 'Arts', 'Ms', 'Ms.', 'Ask', 'Founder', 'Compensation', 'Institutional', 'Tax', 'Taxes', 'Lodge', 'Lodging', 'Readily', 'Healthcare', 'Program', 'Review', 'Programs', 'Disease', 'Neuroimaging', 'Initiative', 'Initiatives',
-    'Neuro', 'Biotherapeutics', 'Critical', 'Accounting', 'Economic', 'Video', 'Offering', 'Investor', 'Relations', 'Warrant', 'Agent', 'Clinical', 'Trial', 'INC.', 'Professor', 'Gross', 'Profit', 'Fully', 'Paid', 'Therapy', 'Breakthrough', 'Medicinal', 'Products', 'Education', 'Affordability', 'Book',
-    'Place', 'IRA', 'Online', 'Privacy', 'Accountants', 'Prospectus', 'Demand', 'Registration', 'Laws', 'Canaccord', 'Limitation', 'Exercise', 'Stamp', 'Debt', 'Insurance', 'Independence', 'Foods', 'Labs', 'Lab', 'Laboratories', 'Budget', 'Brokers', 'Tiger', 'Genetics', 'Law', 'Future', 'Issuance',
-    'Academy', 'Naval', 'Navy', 'Qualified', 'IPO', 'Error', 'Correction', 'Correct', 'Moelis', 'Drive', 'Military', 'Boca', 'Eastern', 'Marine', 'Corps', 'Institute', 'Rule', 'Conduct', 'Provisions', 'Final', 'KGaA', 'Entertainment', 'Works', 'Body', 'Deficit Reduction', 'Menlo Park', 'Palo Alto',
-    'Las Vegas', 'San Francisco', 'Puerto Rico', 'Product Approval', 'Lexington', 'Avenue', 'Climate Change', 'Saudi Arabia', 'Blank Check', 'Monte Carlo', 'Reverse Split' 
-]
-
-def try_to_get_file(dir_name, file_name):
-        file_path=f'./data/sec-ipo-files/{dir_name}/{file_name}'
-        does_exist = os.path.exists(file_path)
-
-        if does_exist:
-            return file_path
-        else:
-            return False
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from keyword_matrix import KeywordMatrix, KeywordMatrixBuilder, wide_to_triplets
+from storage import dataset_exists, existing_dataset_path, read_dataset
+from batch_scheduler import BatchScheduler, chunk_key, partition
+from cache import code_version
+from keyword_counter import trie_pattern
+from stream_merge import concat_csvs, write_csv_chunks
+
+COLUMNS_TO_REMOVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'columns_to_remove.txt')
+
+
+class ColumnExclusion:
+    """Excluded words compiled into one prefix-factored pattern, with the verdict for every feature
+    name cached so each distinct name is only ever checked once per run."""
+
+    def __init__(self, words):
+        self.words = list(dict.fromkeys(words))
+        self.pattern = re.compile(trie_pattern(self.words)) if self.words else None
+        self.keep_cache = {}
+
+    @classmethod
+    def from_file(cls, path=COLUMNS_TO_REMOVE_PATH):
+        with open(path, 'r', encoding='utf-8') as file:
+            lines = [line.strip() for line in file]
+        return cls(line for line in lines if line and not line.startswith('#'))
+
+    def keeps(self, name):
+        keep = self.keep_cache.get(name)
+        if keep is None:
+            keep = self.pattern is None or self.pattern.search(name) is None
+            self.keep_cache[name] = keep
+        return keep
+
+    def keep_mask(self, names):
+        return [self.keeps(name) for name in names]
+
+
+columns_to_remove = ColumnExclusion.from_file()
+
+def legacy_features_path(dir_name):
+    # Wide keyword row left behind by runs before keyword_features, not a filing so not in the corpus index
+    file_path = f'./data/sec-ipo-files/{dir_name}/word_analysis_2.csv'
+    return file_path if os.path.exists(file_path) else None
 
 def get_files_in_directory(directory):
     files = []
@@ -33,115 +54,130 @@ def get_files_in_directory(directory):
         files.append(os.path.join(directory, filename))
     return files
 
-def nightly_build():
+# Ipo day columns that ride along with each filing instead of being features
+DOCUMENT_COLUMNS = {
+    'volume': 'Volume', 'day': 'Day', 'ipo_date': 'IPO_Date', 'open': 'Open', 'close': 'Close',
+    'diff': 'Diff', 'public_price_per_share': 'Public_Price_Per_Share', 'price_public_total': 'Price_Public_Total'
+}
+
+def load_filing_features(dir_name):
+    # Long features written by extract_keywords, or the wide row older runs left behind
+    features_path = f'./data/sec-ipo-files/{dir_name}/keyword_features'
+    if dataset_exists(features_path):
+        return read_dataset(features_path)
+
+    file_path = legacy_features_path(dir_name)
+    if file_path is None:
+        return None
+    ipo_df = pd.read_csv(file_path)
+    return wide_to_triplets(ipo_df, dir_name, exclude=list(DOCUMENT_COLUMNS.values()) + ['symbol'])
+
+def remove_excluded_columns(matrix, exclusion=columns_to_remove):
+    return matrix.select_columns(exclusion.keep_mask(matrix.vocabulary))
+
+def write_keyword_frame(matrix, documents, out_path, min_df=1):
+    """Write the wide keyword dataset from the sparse matrix, a block of filings at a time.
+
+    Features are pruned on the sparse entries first, and only one block of rows is ever dense, so
+    the full filings x vocabulary frame is never built. Ends with the Total row of non-empty counts.
+    """
+    matrix = remove_excluded_columns(matrix).prune(min_df=min_df)
+    documents = documents.set_index('symbol')
+    columns = list(matrix.vocabulary) + ['Symbol'] + list(documents.columns)
+
+    def chunks():
+        for df in matrix.iter_dense():
+            df['Symbol'] = df.index
+            yield df.join(documents, how='left')
+
+        # Filings per feature come from the sparse entries, float like the feature columns they total
+        totals = matrix.document_frequency().astype(float).to_dict()
+        totals['Symbol'] = matrix.shape[0]
+        # Reindexed like the left join, so an int column with missing filings totals as a float too
+        joined = documents.reindex(matrix.symbols)
+        for column, count in joined.count().items():
+            totals[column] = float(count) if joined[column].dtype.kind == 'f' else count
+        yield pd.DataFrame([totals], columns=columns)
+
+    write_csv_chunks(chunks(), out_path, columns)
+    return matrix
+
+def read_ipo_documents():
     files = pd.read_csv('./data/ipo_day_summary.csv')
-    files = files[['symbol', 'url', 'public_price_per_share']]
+    files = files[['symbol', 'url'] + list(DOCUMENT_COLUMNS)]
     files = files.drop_duplicates(subset=['symbol'])
     files['url'] = files['url'].apply(lambda x: x.split('/')[-1])
+    return files
 
-    batches = [(0, 500), (500, 1000), (1000, 1500), (1500, 2000), (2000, 2500), (2500, 3000)]
-    batch_index=0
-    for batch in batches:
-        batch_dfs = []
-        
-        for i,tuple in enumerate(list(files.itertuples(index=False))):
-            dir_name=tuple[0]
-            file_name=tuple[1]
-            public_price_per_share=tuple[2]
-
-
-            # Set batch bounds
-            batch_start=batch[0]
-            batch_end=batch[1]
-            batch_index += 1
-
-            # Want to not continue if the batch is below the start
-            if i < batch_start:
-                continue
-
-            # Get file coordinates
-            file_name="word_analysis_2.csv"
-            file_path = try_to_get_file(dir_name, file_name) 
-
-            # File may not exist
-            if file_path == False:
-                continue
-            
-            ipo_df = pd.read_csv(file_path)
-            ipo_df = ipo_df[[col for col in ipo_df.columns 
-                       if not any(word in col for word in columns_to_remove)]]
-            ipo_df['Symbol'] = dir_name
-            ipo_df['Public_Price_Per_Share'] = public_price_per_share
-
-            ipo_df.to_csv(f'./data/sec-ipo-files/{dir_name}/nightly_build.csv', index=False)
-            batch_dfs.append(ipo_df)
-
-            # Want to break if the batch is above the end, thus need to move to the next batch
-            if i >= batch_end:
-                break
-        
-        print(f"Concatenating Batch {batch}...") 
-        combined_batches = pd.concat(batch_dfs)
-        export_low_count_columns(combined_batches, batch_index)
-        combined_batches.loc['Total'] = combined_batches.count()
-        combined_batches.to_csv(f'./data/keyword_datasets/batch_{batch_index}.csv', index=False)
-
-
-def build_dataset():
-    all_dfs = []
-    
-    df = pd.read_csv('./data/ipo_day_summary.csv')
-    df = df[['symbol', 'url', 'public_price_per_share']]
-    df['url'] = df['url'].apply(lambda x: x.split('/')[-1])
-    df = df.drop_duplicates(subset=['symbol'])
-
-    i=0
-    for tuple in list(df.itertuples(index=False)):
-        i+=1
-        if i < 2000:
-            continue
-        dir_name=tuple[0]
-        file_name=tuple[1]
-        public_price_per_share=tuple[2]
-        # volume=tuple[2]
-        # day=tuple[3]
-        # ipo_date=tuple[4]
-        # open_price=tuple[5]
-        # close=tuple[6]
-        # diff=tuple[7]
-        # public_price_per_share=tuple[8]
-        # price_public_total=tuple[9]
-
-        # Get file coordinates
-        file_name="word_analysis_2.csv"
-        file_path = try_to_get_file(dir_name, file_name) 
-        
+def features_state(dir_name):
+    # Size and mtime of a filing's features, for balancing chunks and invalidating their checkpoints
+    features_path = existing_dataset_path(f'./data/sec-ipo-files/{dir_name}/keyword_features')
+    if features_path is None:
+        features_path = legacy_features_path(dir_name)
+    if not features_path:
+        return 0, None
+    stat = os.stat(features_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def build_chunk_matrix(symbols, output_path):
+    builder = KeywordMatrixBuilder()
+    for dir_name in symbols:
         # File may not exist
-        if file_path == False:
-            print(f"File {file_name} does not exist for {dir_name}")
+        features = load_filing_features(dir_name)
+        if features is None:
             continue
-        
-        ipo_df = pd.read_csv(file_path)
-        ipo_df = ipo_df[[col for col in ipo_df.columns 
-                   if not any(word in col for word in columns_to_remove)]]
-        ipo_df['Symbol'] = dir_name
-        ipo_df['Public_Price_Per_Share'] = public_price_per_share
-        
-        ipo_df.to_csv(f'./data/sec-ipo-files/{dir_name}/word_analysis_3.csv', index=False)
-        all_dfs.append(ipo_df)
-        
-        if i > 2500:
-            break
-
-    print("Concatting") 
-    c = pd.concat(all_dfs)
-    export_low_count_columns(c)
-    c.loc['Total'] = c.count()
-    c.to_csv('./data/eda_dataset_temp.csv', index=False)
-
-def export_low_count_columns(df, index, max_count=6):
-    # Get the total counts from the last row
-    total_counts = df.count()
+        builder.add_triplets(features)
+    return builder.build().save(output_path)
+
+def build_keyword_matrix(symbols, workers=None, n_chunks=32, checkpoint_dir='./data/keyword_datasets/checkpoints'):
+    """Keyword matrix of every symbol, built in byte-balanced chunks across worker processes.
+
+    Each finished chunk is checkpointed with the state of its inputs, so an interrupted build resumes
+    with the chunks it had not finished and an unchanged chunk is not rebuilt on the next run.
+    """
+    symbols = list(symbols)
+    states = [features_state(dir_name) for dir_name in symbols]
+    scheduler = BatchScheduler(checkpoint_dir, workers)
+    # The chunking does not depend on the worker count, so a run resumed with more workers reuses the checkpoints
+    chunks = partition(symbols, [size for size, _ in states], n_chunks=n_chunks)
+
+    version = code_version(build_chunk_matrix, load_filing_features, wide_to_triplets)
+    state_of = dict(zip(symbols, states))
+    keys = [chunk_key(chunk, version, [state_of[dir_name] for dir_name in chunk]) for chunk in chunks]
+
+    outputs = scheduler.run(chunks, build_chunk_matrix, keys)
+    scheduler.prune(keys)
+
+    print(f"Merging {len(outputs)} chunks...")
+    builder = KeywordMatrixBuilder()
+    for output in outputs:
+        matrix = KeywordMatrix.load(output)
+        if matrix is None:
+            raise RuntimeError(f'Chunk output {output} could not be read, delete {scheduler.checkpoint_path} to rebuild every chunk')
+        builder.add_triplets(matrix.to_triplets())
+    return builder.build()
+
+def nightly_build(min_df=1, workers=None):
+    files = read_ipo_documents()
+    documents = files.drop(columns=['url']).rename(columns=DOCUMENT_COLUMNS)
+
+    matrix = write_keyword_frame(build_keyword_matrix(files['symbol'], workers), documents, './data/keyword_datasets/nightly.csv', min_df)
+    export_low_count_columns(matrix, 'nightly')
+    matrix.save('./data/keyword_datasets/nightly_matrix')
+
+
+def build_dataset(min_df=1, workers=None):
+    df = read_ipo_documents()
+    documents = df.drop(columns=['url']).rename(columns=DOCUMENT_COLUMNS)
+
+    print("Building keyword matrix") 
+    matrix = write_keyword_frame(build_keyword_matrix(df['symbol'], workers), documents, './data/eda_dataset_temp.csv', min_df)
+    export_low_count_columns(matrix, 'dataset')
+    matrix.save('./data/eda_dataset_matrix')
+
+def export_low_count_columns(matrix, index, max_count=6):
+    # Filings per feature come straight from the sparse entries
+    total_counts = matrix.document_frequency()
     
     # Find columns with count <= max_count
     low_count_columns = total_counts[total_counts <= max_count]
@@ -166,18 +202,28 @@ def add_urls_to_keyword_analysis():
     new_df.to_csv('./datasets/keyword_analysis_merge.csv', index=False)
 
 
-def main():
+def concat_keyword_datasets():
     files = get_files_in_directory('./data/keyword_datasets/keywords_removed')
 
-    all_dfs = []
-    for file in files:
-        df = pd.read_csv(file)
-        all_dfs.append(df)
-
     print('Concatenating dataframes...')
-    df = pd.concat(all_dfs)
-    df.to_csv('./data/keyword_datasets/keyword_dataset_summary.csv', index=False)
+    concat_csvs(files, './data/keyword_datasets/keyword_dataset_summary.csv')
+
+COMMANDS = {
+    'nightly': lambda args: nightly_build(args.min_df, args.workers),
+    'dataset': lambda args: build_dataset(args.min_df, args.workers),
+    'summary': lambda args: concat_keyword_datasets(),
+    'add-urls': lambda args: add_urls_to_keyword_analysis(),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the keyword datasets from the per-filing keyword features')
+    parser.add_argument('command', nargs='?', choices=list(COMMANDS), default='add-urls', help='nightly and dataset build the keyword matrix with the checkpointed batch scheduler')
+    parser.add_argument('--min-df', type=int, default=1, help='drop features found in fewer filings than this')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for the matrix chunks, defaults to every cpu')
+    args = parser.parse_args()
+
+    COMMANDS[args.command](args)
 
 
-# main()
-add_urls_to_keyword_analysis()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
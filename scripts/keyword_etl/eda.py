@@ -1,15 +1,5 @@
 import plotly.express as px
 import pandas as pd
-import os
-
-def try_to_get_file(dir_name, file_name):
-        file_path=f'./data/sec-ipo-files/{dir_name}/{file_name}'
-        does_exist = os.path.exists(file_path)
-
-        if does_exist:
-            return file_path
-        else:
-            return False
 
 def plot_largest_diffs(df):
     df.drop(['Day', 'Close', 'Volume', 'Public_Price_Per_Share', 'Price_Public_Total'], axis=1, inplace=True)
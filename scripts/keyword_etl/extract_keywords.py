@@ -1,9 +1,19 @@
 import pandas as pd
-import re
-from bs4 import BeautifulSoup
+import argparse
 import os
+import re
+import sys
+import time
+from abc import ABC, abstractmethod
 from nltk import ne_chunk, pos_tag, word_tokenize
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from prospectus import load_prospectus
+from keyword_counter import KeywordCounter
+from keyword_matrix import KeywordMatrixBuilder, TRIPLET_COLUMNS
+from storage import write_dataset
+from corpus_index import CorpusIndex
+
 # nltk.download('punkt_tab')
 # nltk.download('averaged_perceptron_tagger')
 # nltk.download('maxent_ne_chunker')
@@ -11,187 +21,295 @@ from nltk import ne_chunk, pos_tag, word_tokenize
 # nltk.download('averaged_perceptron_tagger_eng')
 # nltk.download('maxent_ne_chunker_tab')
 
-def try_to_get_file(dir_name, file_name):
-        file_path=f'./data/sec-ipo-files/{dir_name}/{file_name}'
-        does_exist = os.path.exists(file_path)
+class NerBackend(ABC):
+    """Finds candidate person names in a document and records how long each document took.
 
-        if does_exist:
-            return file_path
-        else:
-            return False
+    Subclasses implement `find_names`, `extract` wraps it with the per-document timing so backends
+    can be compared on the same filings with `report`.
+    """
+    name = None
 
-def extract_person_names(soup):
-    text = soup.get_text()
-    # Tokenize and tag
-    tokens = word_tokenize(text)
-    pos_tags = pos_tag(tokens)
-    
-    # Named entity recognition
-    tree = ne_chunk(pos_tags)
-    
-    keyword_counts = {}
-    for subtree in tree:
-        if hasattr(subtree, 'label') and subtree.label() == 'PERSON':
-            name = ' '.join([token for token, pos in subtree.leaves()])
-            if name in keyword_counts:
-                continue
-            
-            if not is_this_a_person(name):
-                continue
+    def __init__(self):
+        self.latencies = []
+
+    @abstractmethod
+    def find_names(self, text):
+        """Yield every candidate person name in `text`."""
+
+    def extract(self, text):
+        start = time.perf_counter()
+        names = list(self.find_names(text))
+        self.latencies.append(time.perf_counter() - start)
+        return names
+
+    def report(self):
+        if not self.latencies:
+            return
+        latencies = sorted(self.latencies)
+        total = sum(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f'{self.name}: {len(latencies)} documents, mean {total / len(latencies) * 1000:.1f} ms, '
+              f'p95 {p95 * 1000:.1f} ms, {len(latencies) / total:.1f} documents/s')
+
+
+class NltkNerBackend(NerBackend):
+    """Full NLTK pipeline: tokenize, part of speech tag and named entity chunk the whole text."""
+    name = 'nltk'
+
+    def find_names(self, text):
+        # Tokenize and tag
+        tokens = word_tokenize(text)
+        pos_tags = pos_tag(tokens)
+        
+        # Named entity recognition
+        tree = ne_chunk(pos_tags)
+        for subtree in tree:
+            if hasattr(subtree, 'label') and subtree.label() == 'PERSON':
+                yield ' '.join([token for token, pos in subtree.leaves()])
+
+
+NAME_TITLE_WORDS = frozenset({
+    'Mr', 'Mr.', 'Mrs', 'Mrs.', 'Ms', 'Ms.', 'Dr', 'Dr.', 'Jr', 'Jr.', 'Sr', 'Sr.',
+    'Chief', 'Executive', 'Officer', 'Financial', 'Operating', 'Technology', 'President', 'Vice',
+    'Chairman', 'Chairwoman', 'Director', 'Directors', 'Senior', 'General', 'Counsel', 'Secretary',
+    'Treasurer', 'Founder', 'Co-Founder', 'Partner', 'Managing', 'Independent', 'Lead'
+})
+
+class CapitalizedNameBackend(NerBackend):
+    """Rule based: runs of two or three capitalised words or initials, checked with is_this_a_person.
+
+    Runs are split at titles such as "Chief Executive Officer" and honorifics, and runs that are still
+    longer are searched for bigrams (or trigrams with a middle initial) that pass.
+    """
+    name = 'heuristic'
+    run_pattern = re.compile(r"\b[A-Z](?:[a-z]+|\.)(?:[A-Za-z'\-]*)(?:[ \t]+[A-Z](?:[a-z]+|\.)(?:[A-Za-z'\-]*))+")
+
+    def find_names(self, text):
+        for match in self.run_pattern.finditer(text):
+            for parts in self.split_titles(match.group(0).split()):
+                yield from self.run_candidates(parts)
+
+    @staticmethod
+    def split_titles(parts):
+        # Titles and honorifics end one name and never belong to the next
+        run = []
+        for part in parts:
+            if part in NAME_TITLE_WORDS:
+                if len(run) >= 2:
+                    yield run
+                run = []
+            else:
+                run.append(part)
+        if len(run) >= 2:
+            yield run
+
+    @staticmethod
+    def run_candidates(parts):
+        if len(parts) <= 3:
+            yield ' '.join(parts)
+            return
 
-            pattern = r'\b' + re.escape(name) + r'\b'
-            matches = re.findall(pattern, text)
-            keyword_counts[name] = len(matches)  
-   
+        i = 0
+        while i < len(parts) - 1:
+            # Inside a long run only a middle initial makes a trigram
+            size = 3 if i + 2 < len(parts) and re.fullmatch(r'[A-Z]\.', parts[i + 1]) else 2
+            candidate = ' '.join(parts[i:i + size])
+            if is_this_a_person(candidate):
+                yield candidate
+                i += size
+            else:
+                i += 1
+
+
+# Sections each extractor reads, the whole prospectus is used when none of them are found
+NAME_SECTIONS = ('management', 'principal_stockholders')
+UNDERWRITER_SECTIONS = ('underwriting',)
+
+
+NER_BACKENDS = {
+    'nltk': NltkNerBackend,
+    'heuristic': CapitalizedNameBackend,
+}
+
+def make_ner_backend(name='nltk'):
+    return NER_BACKENDS[name]()
+
+default_ner_backend = NltkNerBackend()
+
+def extract_person_names(text, backend=None, search_text=None):
+    """Count the person names found in `search_text` (the whole `text` by default) across `text`."""
+    backend = backend or default_ner_backend
+
+    # Collect the accepted names first, each distinct candidate is judged once
+    names = []
+    seen = set()
+    for name in backend.extract(search_text or text):
+        if name in seen:
+            continue
+        seen.add(name)
+        
+        if not is_this_a_person(name):
+            continue
+        names.append(name)
+
+    if not names:
+        return []
+
+    # Then count every name in one pass over the whole text, whole words and case sensitive as before
+    keyword_counts = KeywordCounter(names, ignore_case=False).count(text)
     return list(keyword_counts.items())  
 
+# Immediate rejections for obvious non-person terms, built once for every candidate name
+DEFINITE_NON_PERSON_WORDS = frozenset({
+    'Corporation', 'Company', 'Inc', 'LLC', 'Ltd', 'Group', 'Holdings', 
+    'Capital', 'Management', 'Partners', 'Associates', 'Fund', 'Funds',
+    'Acquisition', 'Investment', 'Ventures', 'Trust', 'Bank', 'Securities',
+    'Services', 'Systems', 'Solutions', 'Technologies', 'Global', 'International',
+    'Committee', 'Board', 'Directors', 'Report', 'Act', 'Rules', 'Legal',
+    'Market', 'Exchange', 'Class', 'Unit', 'Program', 'Factor', 'Factors',
+    'Risk', 'Risks', 'Income', 'Tax', 'Revenue', 'Business', 'Initial',
+    'Target', 'Portfolio', 'Vehicle', 'Presence', 'Knowledge', 'Support',
+    'Value', 'Shares', 'Impact', 'System', 'Current', 'Annual', 'Special',
+    'Energy', 'Power', 'Infrastructure', 'Opportunities', 'Strategic',
+    'Initiatives', 'Credit', 'Equity', 'Lending', 'Real', 'Estate',
+    'Commercial', 'Private', 'Public', 'Corporate', 'Direct', 'Mezzanine',
+    'Dynamic', 'Robust', 'Sourcing', 'Scaled', 'Investing', 'Hardware',
+    'Software', 'Supply', 'Stores', 'Center', 'Holdings', 'Brands',
+    'Waste', 'Advisory', 'Royal', 'Purpose', 'Unless', 'Except', 'Due',
+    'Further', 'Highly', 'Known', 'Trends', 'Ability', 'Islands', 'Cayman', 'High', 'Distinction',
+    'Life', 'Science', 'Health', 'Services', 'Systems', 'Solutions', 'Technologies', 'Global', 'International',
+    'Committee', 'Board', 'Directors', 'Report', 'Act', 'Rules', 'Legal',
+    'Market', 'Exchange', 'Class', 'Unit', 'Program', 'Factor', 'Factors',
+    'Risk', 'Risks', 'Income', 'Tax', 'Revenue', 'Business', 'Initial',
+    'Target', 'Portfolio', 'Vehicle', 'Presence', 'Knowledge', 'Support',
+    'Value', 'Shares', 'Impact', 'System', 'Current', 'Annual', 'Special',
+    'Energy', 'Power', 'Infrastructure', 'Opportunities', 'Strategic',
+    'Initiatives', 'Credit', 'Equity', 'Lending', 'Real', 'Estate',
+    'Commercial', 'Private', 'Public', 'Corporate', 'Direct', 'Mezzanine',
+    'Dynamic', 'Robust', 'Sourcing', 'Scaled', 'Investing', 'Hardware',
+    'Software', 'Supply', 'Stores', 'Center', 'Holdings', 'Brands',
+    'Waste', 'Advisory', 'Royal', 'Purpose', 'Unless', 'Except', 'Due',
+    'Further', 'Highly', 'Known', 'Trends', 'Ability', 'Islands', 'Cayman', 'High', 'Distinction',
+    'Life', 'Science', 'Health', 'Services', 'Systems', 'Solutions', 'Technologies', 'Global', 'International',
+    'Committee', 'Board', 'Directors', 'Report', 'Act', 'Rules', 'Legal',
+    'Market', 'Exchange', 'Class', 'Unit', 'Program', 'Factor', 'Factors',
+    'Employee', 'Employees', 'Director', 'Directors', 'Management', 'Managers',
+    'School', 'Periodic', 'Periodically', 'Reporting', 'Period', 'Periods',
+    'Netherlands', 'Australia', 'New', 'York', 'United', 'States', 'State', 'U.S.', 'U.S.A.', 'U.S.A', 'U.S', 'U.S.', 'U.S.A.', 'U.S.A', 'U.S',
+    'University', 'Liabilities', 'Liability', 'Civil', 'Civilian', 'Civilians', "Net", 'Loss', 'Loan', 'Explanatory', 'Paragraph'
+
+    # Business/Legal entities
+    'Enterprise', 'Enterprises', 'Industries', 'Organization', 'Organizations',
+    'Institution', 'Institutions', 'Foundation', 'Foundations', 'Agency', 'Agencies',
+    'Authority', 'Authorities', 'Department', 'Departments', 'Ministry', 'Bureau',
+    'Office', 'Division', 'Subsidiary', 'Subsidiaries', 'Affiliate', 'Affiliates',
+    'Partnership', 'Partnerships', 'Consortium', 'Alliance', 'Network', 'Networks',
+    'Platform', 'Platforms', 'Framework', 'Frameworks', 'Structure', 'Structures',
+
+    # Financial/Investment terms
+    'Assets', 'Asset', 'Capital', 'Capitalization', 'Financing', 'Finance',
+    'Securities', 'Security', 'Bond', 'Bonds', 'Stock', 'Stocks', 'Options',
+    'Derivatives', 'Commodities', 'Currency', 'Currencies', 'Treasury',
+    'Reserve', 'Reserves', 'Liquidity', 'Volatility', 'Yield', 'Returns',
+    'Performance', 'Benchmark', 'Index', 'Indices', 'Rating', 'Ratings',
+    'Valuation', 'Pricing', 'Premium', 'Discount', 'Margin', 'Margins',
+
+    # Business operations
+    'Operations', 'Operation', 'Process', 'Processes', 'Procedure', 'Procedures',
+    'Strategy', 'Strategies', 'Planning', 'Development', 'Implementation',
+    'Execution', 'Delivery', 'Production', 'Manufacturing', 'Distribution',
+    'Supply', 'Chain', 'Logistics', 'Procurement', 'Sourcing', 'Vendor',
+    'Vendors', 'Client', 'Clients', 'Customer', 'Customers', 'Consumer',
+    'Consumers', 'Market', 'Markets', 'Segment', 'Segments', 'Channel',
+    'Channels', 'Sales', 'Marketing', 'Advertising', 'Promotion', 'Brand',
+
+    # Technology/Systems
+    'Technology', 'Technologies', 'Innovation', 'Innovations', 'Research',
+    'Development', 'Engineering', 'Design', 'Architecture', 'Infrastructure',
+    'Database', 'Databases', 'Application', 'Applications', 'Interface',
+    'Interfaces', 'Protocol', 'Protocols', 'Standard', 'Standards',
+    'Specification', 'Specifications', 'Configuration', 'Integration',
+    'Automation', 'Analytics', 'Data', 'Information', 'Intelligence',
+
+    # Geographic/Location terms
+    'Region', 'Regions', 'Territory', 'Territories', 'Area', 'Areas',
+    'Zone', 'Zones', 'District', 'Districts', 'County', 'Counties',
+    'State', 'States', 'Province', 'Provinces', 'Country', 'Countries',
+    'Nation', 'Nations', 'City', 'Cities', 'Town', 'Towns', 'Village',
+    'Villages', 'Location', 'Locations', 'Site', 'Sites', 'Facility',
+    'Facilities', 'Campus', 'Building', 'Buildings', 'Complex',
+
+    # Time/Temporal terms
+    'Period', 'Periods', 'Quarter', 'Quarters', 'Year', 'Years', 'Month',
+    'Months', 'Week', 'Weeks', 'Day', 'Days', 'Date', 'Dates', 'Time',
+    'Timeline', 'Schedule', 'Phase', 'Phases', 'Stage', 'Stages',
+    'Cycle', 'Cycles', 'Term', 'Terms', 'Duration', 'Interval', 'Intervals',
+
+    # Abstract concepts
+    'Concept', 'Concepts', 'Principle', 'Principles', 'Theory', 'Theories',
+    'Model', 'Models', 'Method', 'Methods', 'Approach', 'Approaches',
+    'Technique', 'Techniques', 'Practice', 'Practices', 'Standard', 'Standards',
+    'Quality', 'Efficiency', 'Effectiveness', 'Productivity', 'Capacity',
+    'Capability', 'Capabilities', 'Competency', 'Competencies', 'Skill',
+    'Skills', 'Expertise', 'Experience', 'Knowledge', 'Understanding',
+
+    # Measurement/Quantitative terms
+    'Metric', 'Metrics', 'Measure', 'Measures', 'Indicator', 'Indicators',
+    'Parameter', 'Parameters', 'Variable', 'Variables', 'Factor', 'Factors',
+    'Rate', 'Rates', 'Ratio', 'Ratios', 'Percentage', 'Percent', 'Amount',
+    'Amounts', 'Volume', 'Volumes', 'Size', 'Scale', 'Level', 'Levels',
+    'Degree', 'Degrees', 'Range', 'Ranges', 'Limit', 'Limits', 'Threshold',
+
+    # Document/Communication terms
+    'Document', 'Documents', 'Report', 'Reports', 'Statement', 'Statements',
+    'Filing', 'Filings', 'Disclosure', 'Disclosures', 'Notice', 'Notices',
+    'Announcement', 'Announcements', 'Communication', 'Communications',
+    'Message', 'Messages', 'Letter', 'Letters', 'Memo', 'Memorandum',
+    'Agreement', 'Agreements', 'Contract', 'Contracts', 'Policy', 'Policies',
+
+    # Status/Condition terms
+    'Status', 'Condition', 'Conditions', 'State', 'Situation', 'Situations',
+    'Position', 'Positions', 'Standing', 'Ranking', 'Classification',
+    'Category', 'Categories', 'Type', 'Types', 'Kind', 'Kinds', 'Form',
+    'Forms', 'Nature', 'Character', 'Characteristic', 'Characteristics',
+
+    # Action/Process terms
+    'Action', 'Actions', 'Activity', 'Activities', 'Event', 'Events',
+    'Transaction', 'Transactions', 'Transfer', 'Transfers', 'Exchange',
+    'Exchanges', 'Trade', 'Trading', 'Purchase', 'Purchases', 'Sale',
+    'Sales', 'Acquisition', 'Acquisitions', 'Merger', 'Mergers',
+    'Consolidation', 'Restructuring', 'Reorganization', 'Transformation',
+
+    # Common adjectives that appear as standalone terms
+    'General', 'Specific', 'Primary', 'Secondary', 'Main', 'Principal',
+    'Major', 'Minor', 'Senior', 'Junior', 'Executive', 'Administrative',
+    'Technical', 'Professional', 'Commercial', 'Industrial', 'Residential',
+    'Domestic', 'Foreign', 'Local', 'Regional', 'National', 'International',
+    'Global', 'Universal', 'Common', 'Standard', 'Basic', 'Advanced',
+    'Premium', 'Superior', 'Excellent', 'Outstanding', 'Exceptional',
+
+    # Miscellaneous common non-person terms
+    'Item', 'Items', 'Object', 'Objects', 'Thing', 'Things', 'Matter',
+    'Issue', 'Issues', 'Problem', 'Problems', 'Solution', 'Solutions',
+    'Result', 'Results', 'Outcome', 'Outcomes', 'Effect', 'Effects',
+    'Impact', 'Impacts', 'Influence', 'Benefit', 'Benefits', 'Advantage',
+    'Advantages', 'Disadvantage', 'Disadvantages', 'Cost', 'Costs',
+    'Expense', 'Expenses', 'Fee', 'Fees', 'Charge', 'Charges', 'Price',
+    'Prices', 'Worth', 'Value', 'Values'
+})
+
+# No special characters except periods and hyphens
+ALLOWED_NAME_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ .-')
+
 def is_this_a_person(name):
     # Must be 2-3 words only
     name_parts = name.split()
     if len(name_parts) < 2 or len(name_parts) > 3:
         return False
     
-    # Immediate rejections for obvious non-person terms
-    definite_non_person_words = {
-        'Corporation', 'Company', 'Inc', 'LLC', 'Ltd', 'Group', 'Holdings', 
-        'Capital', 'Management', 'Partners', 'Associates', 'Fund', 'Funds',
-        'Acquisition', 'Investment', 'Ventures', 'Trust', 'Bank', 'Securities',
-        'Services', 'Systems', 'Solutions', 'Technologies', 'Global', 'International',
-        'Committee', 'Board', 'Directors', 'Report', 'Act', 'Rules', 'Legal',
-        'Market', 'Exchange', 'Class', 'Unit', 'Program', 'Factor', 'Factors',
-        'Risk', 'Risks', 'Income', 'Tax', 'Revenue', 'Business', 'Initial',
-        'Target', 'Portfolio', 'Vehicle', 'Presence', 'Knowledge', 'Support',
-        'Value', 'Shares', 'Impact', 'System', 'Current', 'Annual', 'Special',
-        'Energy', 'Power', 'Infrastructure', 'Opportunities', 'Strategic',
-        'Initiatives', 'Credit', 'Equity', 'Lending', 'Real', 'Estate',
-        'Commercial', 'Private', 'Public', 'Corporate', 'Direct', 'Mezzanine',
-        'Dynamic', 'Robust', 'Sourcing', 'Scaled', 'Investing', 'Hardware',
-        'Software', 'Supply', 'Stores', 'Center', 'Holdings', 'Brands',
-        'Waste', 'Advisory', 'Royal', 'Purpose', 'Unless', 'Except', 'Due',
-        'Further', 'Highly', 'Known', 'Trends', 'Ability', 'Islands', 'Cayman', 'High', 'Distinction',
-        'Life', 'Science', 'Health', 'Services', 'Systems', 'Solutions', 'Technologies', 'Global', 'International',
-        'Committee', 'Board', 'Directors', 'Report', 'Act', 'Rules', 'Legal',
-        'Market', 'Exchange', 'Class', 'Unit', 'Program', 'Factor', 'Factors',
-        'Risk', 'Risks', 'Income', 'Tax', 'Revenue', 'Business', 'Initial',
-        'Target', 'Portfolio', 'Vehicle', 'Presence', 'Knowledge', 'Support',
-        'Value', 'Shares', 'Impact', 'System', 'Current', 'Annual', 'Special',
-        'Energy', 'Power', 'Infrastructure', 'Opportunities', 'Strategic',
-        'Initiatives', 'Credit', 'Equity', 'Lending', 'Real', 'Estate',
-        'Commercial', 'Private', 'Public', 'Corporate', 'Direct', 'Mezzanine',
-        'Dynamic', 'Robust', 'Sourcing', 'Scaled', 'Investing', 'Hardware',
-        'Software', 'Supply', 'Stores', 'Center', 'Holdings', 'Brands',
-        'Waste', 'Advisory', 'Royal', 'Purpose', 'Unless', 'Except', 'Due',
-        'Further', 'Highly', 'Known', 'Trends', 'Ability', 'Islands', 'Cayman', 'High', 'Distinction',
-        'Life', 'Science', 'Health', 'Services', 'Systems', 'Solutions', 'Technologies', 'Global', 'International',
-        'Committee', 'Board', 'Directors', 'Report', 'Act', 'Rules', 'Legal',
-        'Market', 'Exchange', 'Class', 'Unit', 'Program', 'Factor', 'Factors',
-        'Employee', 'Employees', 'Director', 'Directors', 'Management', 'Managers',
-        'School', 'Periodic', 'Periodically', 'Reporting', 'Period', 'Periods',
-        'Netherlands', 'Australia', 'New', 'York', 'United', 'States', 'State', 'U.S.', 'U.S.A.', 'U.S.A', 'U.S', 'U.S.', 'U.S.A.', 'U.S.A', 'U.S',
-        'University', 'Liabilities', 'Liability', 'Civil', 'Civilian', 'Civilians', "Net", 'Loss', 'Loan', 'Explanatory', 'Paragraph'
-
-        # Business/Legal entities
-        'Enterprise', 'Enterprises', 'Industries', 'Organization', 'Organizations',
-        'Institution', 'Institutions', 'Foundation', 'Foundations', 'Agency', 'Agencies',
-        'Authority', 'Authorities', 'Department', 'Departments', 'Ministry', 'Bureau',
-        'Office', 'Division', 'Subsidiary', 'Subsidiaries', 'Affiliate', 'Affiliates',
-        'Partnership', 'Partnerships', 'Consortium', 'Alliance', 'Network', 'Networks',
-        'Platform', 'Platforms', 'Framework', 'Frameworks', 'Structure', 'Structures',
-    
-        # Financial/Investment terms
-        'Assets', 'Asset', 'Capital', 'Capitalization', 'Financing', 'Finance',
-        'Securities', 'Security', 'Bond', 'Bonds', 'Stock', 'Stocks', 'Options',
-        'Derivatives', 'Commodities', 'Currency', 'Currencies', 'Treasury',
-        'Reserve', 'Reserves', 'Liquidity', 'Volatility', 'Yield', 'Returns',
-        'Performance', 'Benchmark', 'Index', 'Indices', 'Rating', 'Ratings',
-        'Valuation', 'Pricing', 'Premium', 'Discount', 'Margin', 'Margins',
-    
-        # Business operations
-        'Operations', 'Operation', 'Process', 'Processes', 'Procedure', 'Procedures',
-        'Strategy', 'Strategies', 'Planning', 'Development', 'Implementation',
-        'Execution', 'Delivery', 'Production', 'Manufacturing', 'Distribution',
-        'Supply', 'Chain', 'Logistics', 'Procurement', 'Sourcing', 'Vendor',
-        'Vendors', 'Client', 'Clients', 'Customer', 'Customers', 'Consumer',
-        'Consumers', 'Market', 'Markets', 'Segment', 'Segments', 'Channel',
-        'Channels', 'Sales', 'Marketing', 'Advertising', 'Promotion', 'Brand',
-    
-        # Technology/Systems
-        'Technology', 'Technologies', 'Innovation', 'Innovations', 'Research',
-        'Development', 'Engineering', 'Design', 'Architecture', 'Infrastructure',
-        'Database', 'Databases', 'Application', 'Applications', 'Interface',
-        'Interfaces', 'Protocol', 'Protocols', 'Standard', 'Standards',
-        'Specification', 'Specifications', 'Configuration', 'Integration',
-        'Automation', 'Analytics', 'Data', 'Information', 'Intelligence',
-    
-        # Geographic/Location terms
-        'Region', 'Regions', 'Territory', 'Territories', 'Area', 'Areas',
-        'Zone', 'Zones', 'District', 'Districts', 'County', 'Counties',
-        'State', 'States', 'Province', 'Provinces', 'Country', 'Countries',
-        'Nation', 'Nations', 'City', 'Cities', 'Town', 'Towns', 'Village',
-        'Villages', 'Location', 'Locations', 'Site', 'Sites', 'Facility',
-        'Facilities', 'Campus', 'Building', 'Buildings', 'Complex',
-    
-        # Time/Temporal terms
-        'Period', 'Periods', 'Quarter', 'Quarters', 'Year', 'Years', 'Month',
-        'Months', 'Week', 'Weeks', 'Day', 'Days', 'Date', 'Dates', 'Time',
-        'Timeline', 'Schedule', 'Phase', 'Phases', 'Stage', 'Stages',
-        'Cycle', 'Cycles', 'Term', 'Terms', 'Duration', 'Interval', 'Intervals',
-    
-        # Abstract concepts
-        'Concept', 'Concepts', 'Principle', 'Principles', 'Theory', 'Theories',
-        'Model', 'Models', 'Method', 'Methods', 'Approach', 'Approaches',
-        'Technique', 'Techniques', 'Practice', 'Practices', 'Standard', 'Standards',
-        'Quality', 'Efficiency', 'Effectiveness', 'Productivity', 'Capacity',
-        'Capability', 'Capabilities', 'Competency', 'Competencies', 'Skill',
-        'Skills', 'Expertise', 'Experience', 'Knowledge', 'Understanding',
-    
-        # Measurement/Quantitative terms
-        'Metric', 'Metrics', 'Measure', 'Measures', 'Indicator', 'Indicators',
-        'Parameter', 'Parameters', 'Variable', 'Variables', 'Factor', 'Factors',
-        'Rate', 'Rates', 'Ratio', 'Ratios', 'Percentage', 'Percent', 'Amount',
-        'Amounts', 'Volume', 'Volumes', 'Size', 'Scale', 'Level', 'Levels',
-        'Degree', 'Degrees', 'Range', 'Ranges', 'Limit', 'Limits', 'Threshold',
-    
-        # Document/Communication terms
-        'Document', 'Documents', 'Report', 'Reports', 'Statement', 'Statements',
-        'Filing', 'Filings', 'Disclosure', 'Disclosures', 'Notice', 'Notices',
-        'Announcement', 'Announcements', 'Communication', 'Communications',
-        'Message', 'Messages', 'Letter', 'Letters', 'Memo', 'Memorandum',
-        'Agreement', 'Agreements', 'Contract', 'Contracts', 'Policy', 'Policies',
-    
-        # Status/Condition terms
-        'Status', 'Condition', 'Conditions', 'State', 'Situation', 'Situations',
-        'Position', 'Positions', 'Standing', 'Ranking', 'Classification',
-        'Category', 'Categories', 'Type', 'Types', 'Kind', 'Kinds', 'Form',
-        'Forms', 'Nature', 'Character', 'Characteristic', 'Characteristics',
-    
-        # Action/Process terms
-        'Action', 'Actions', 'Activity', 'Activities', 'Event', 'Events',
-        'Transaction', 'Transactions', 'Transfer', 'Transfers', 'Exchange',
-        'Exchanges', 'Trade', 'Trading', 'Purchase', 'Purchases', 'Sale',
-        'Sales', 'Acquisition', 'Acquisitions', 'Merger', 'Mergers',
-        'Consolidation', 'Restructuring', 'Reorganization', 'Transformation',
-    
-        # Common adjectives that appear as standalone terms
-        'General', 'Specific', 'Primary', 'Secondary', 'Main', 'Principal',
-        'Major', 'Minor', 'Senior', 'Junior', 'Executive', 'Administrative',
-        'Technical', 'Professional', 'Commercial', 'Industrial', 'Residential',
-        'Domestic', 'Foreign', 'Local', 'Regional', 'National', 'International',
-        'Global', 'Universal', 'Common', 'Standard', 'Basic', 'Advanced',
-        'Premium', 'Superior', 'Excellent', 'Outstanding', 'Exceptional',
-    
-        # Miscellaneous common non-person terms
-        'Item', 'Items', 'Object', 'Objects', 'Thing', 'Things', 'Matter',
-        'Issue', 'Issues', 'Problem', 'Problems', 'Solution', 'Solutions',
-        'Result', 'Results', 'Outcome', 'Outcomes', 'Effect', 'Effects',
-        'Impact', 'Impacts', 'Influence', 'Benefit', 'Benefits', 'Advantage',
-        'Advantages', 'Disadvantage', 'Disadvantages', 'Cost', 'Costs',
-        'Expense', 'Expenses', 'Fee', 'Fees', 'Charge', 'Charges', 'Price',
-        'Prices', 'Worth', 'Value', 'Values'
-    }
     
     # Reject if any part is a non-person word
-    if any(part in definite_non_person_words for part in name_parts):
+    if any(part in DEFINITE_NON_PERSON_WORDS for part in name_parts):
         return False
     
     # Must start with capital letters (proper nouns)
@@ -203,8 +321,7 @@ def is_this_a_person(name):
         return False
     
     # No special characters except periods and hyphens
-    allowed_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ .-')
-    if not all(char in allowed_chars for char in name):
+    if not all(char in ALLOWED_NAME_CHARS for char in name):
         return False
     
     # Check for typical person name patterns
@@ -232,70 +349,60 @@ key_patterns = [
     'InterestExpense', 'IncomeTaxExpense'
 ]
 
+# Common underwriter patterns
+UNDERWRITER_KEYWORDS = [
+    'morgan stanley', 'goldman sachs', 'jp morgan', 'jpmorgan', 'citigroup', 'citi',
+    'bank of america', 'merrill lynch', 'wells fargo', 'barclays', 'credit suisse',
+    'deutsche bank', 'ubs', 'jefferies', 'cowen', 'piper sandler', 'raymond james',
+    'william blair', 'stifel', 'canaccord', 'rbc capital', 'bmo capital',
+    'evercore', 'lazard', 'moelis', 'centerview'
+]
+UNDERWRITER_TABLE_TERMS = ['underwriter', 'book-running manager', 'lead manager']
+UNDERWRITER_CONTEXT_TERMS = ['underwriter', 'book-running', 'lead manager', 'offering']
+
+# Banks match whole words, the section terms also match inside longer words like "underwriters"
+underwriter_counter = KeywordCounter(UNDERWRITER_KEYWORDS, substrings=UNDERWRITER_TABLE_TERMS + UNDERWRITER_CONTEXT_TERMS)
+
 def extract_underwriters(soup, html_content):
     underwriters = []
     
-    # Common underwriter patterns
-    underwriter_keywords = [
-        'morgan stanley', 'goldman sachs', 'jp morgan', 'jpmorgan', 'citigroup', 'citi',
-        'bank of america', 'merrill lynch', 'wells fargo', 'barclays', 'credit suisse',
-        'deutsche bank', 'ubs', 'jefferies', 'cowen', 'piper sandler', 'raymond james',
-        'william blair', 'stifel', 'canaccord', 'rbc capital', 'bmO capital',
-        'evercore', 'lazard', 'moelis', 'centerview'
-    ]
-    
-    # Look for underwriter sections
-    text_lower = html_content.lower()
-    
     # Find underwriter tables or sections
     tables = soup.find_all('table')
     for table in tables:
-        table_text = table.get_text().lower()
-        if any(term in table_text for term in ['underwriter', 'book-running manager', 'lead manager']):
-            for keyword in underwriter_keywords:
-                if keyword in table_text:
+        matches = underwriter_counter.scan(table.get_text())
+        if any(matches.count(term) for term in UNDERWRITER_TABLE_TERMS):
+            for keyword in UNDERWRITER_KEYWORDS:
+                if matches.count(keyword):
                     underwriters.append(keyword.title())
     
-    # Also search in general text
-    for keyword in underwriter_keywords:
-        if keyword in text_lower:
-            # Check if it's in an underwriting context
-            context_window = 200  # characters around the match
-            for match in re.finditer(re.escape(keyword), text_lower):
-                start = max(0, match.start() - context_window)
-                end = min(len(text_lower), match.end() + context_window)
-                context = text_lower[start:end]
-                
-                if any(term in context for term in ['underwriter', 'book-running', 'lead manager', 'offering']):
-                    underwriters.append(keyword.title())
-                    break
+    # Also search in general text, a bank counts when it appears in an underwriting context
+    matches = underwriter_counter.scan(html_content)
+    context_window = 200  # characters around the match
+    for keyword in UNDERWRITER_KEYWORDS:
+        if matches.near(keyword, UNDERWRITER_CONTEXT_TERMS, context_window):
+            underwriters.append(keyword.title())
     
     return list(set(underwriters))
 
-def analyze_prospectus_keywords(soup):
-    text = soup.get_text().lower()
-    target_keywords = [
-        # Technology
-        'technology', 'software', 'ai', 'machine learning',
-        'cloud', 'saas', 'platform', 'digital', 'data', 'analytics', 'algorithm',
-        'automation', 'blockchain', 'cryptocurrency', 'cybersecurity',
-        'subscription', 'recurring','e-commerce', 'mobile', 'app', 'virtual',
-        
-        # Industry specific
-        'healthcare', 'biotech', 'pharmaceutical', 'medical', 'clinical',
-        'energy', 'renewable', 'solar', 'electric', 'battery',
-        'real estate', 'logistics', 'transportation', 'automotive',
-    ]
-    
-    # Count keyword frequencies
-    keyword_counts = {}
-    
-    for kw in target_keywords:
-        # Use word boundaries for exact matches, case insensitive
-        pattern = r'\b' + re.escape(kw.lower()) + r'\b'
-        matches = re.findall(pattern, text)
-        keyword_counts[kw] = len(matches)
-    
+TARGET_KEYWORDS = [
+    # Technology
+    'technology', 'software', 'ai', 'machine learning',
+    'cloud', 'saas', 'platform', 'digital', 'data', 'analytics', 'algorithm',
+    'automation', 'blockchain', 'cryptocurrency', 'cybersecurity',
+    'subscription', 'recurring','e-commerce', 'mobile', 'app', 'virtual',
+    
+    # Industry specific
+    'healthcare', 'biotech', 'pharmaceutical', 'medical', 'clinical',
+    'energy', 'renewable', 'solar', 'electric', 'battery',
+    'real estate', 'logistics', 'transportation', 'automotive',
+]
+
+# Built once, every filing is counted in a single pass however many keywords there are
+prospectus_keyword_counter = KeywordCounter(TARGET_KEYWORDS)
+
+def analyze_prospectus_keywords(text):
+    # Word boundaries for exact matches, case insensitive
+    keyword_counts = prospectus_keyword_counter.count(text)
     return list(keyword_counts.items())
 
 
@@ -336,75 +443,87 @@ def generate_underwriter_dataframe(underwriters):
         rows.append(row)
     return pd.DataFrame(rows)
 
-def pivot_df(df):
-    current_cols = df.set_index('Element_Name')['Value']
-    result = pd.concat([current_cols]).to_frame().T
-    result = result.dropna(axis=1, how='any')
+def generate_triplets(dir_name, keyword_df, names_df, underwriter_df):
+    # One long frame per filing, every frame has the same columns so nothing widens
+    df = pd.concat([keyword_df, names_df, underwriter_df], ignore_index=True)
+    if df.empty:
+        return pd.DataFrame(columns=TRIPLET_COLUMNS)
 
-    return result
+    df = df.rename(columns={'Element_Name': 'element_name', 'Value': 'value', 'Data_Type': 'data_type'})
+    df['symbol'] = dir_name
+    return df[TRIPLET_COLUMNS].dropna(subset=['value'])
 
 
-
-def main():
-    all_dfs = []
+def build_keyword_features(ner_backend='nltk', sections_only=False):
+    # Pick the accuracy/throughput trade-off for person names, see NER_BACKENDS
+    backend = make_ner_backend(ner_backend)
+    builder = KeywordMatrixBuilder()
+    documents = []
     
     df = pd.read_csv('./data/ipo_day_summary.csv')
     df = df[['symbol', 'url', 'volume', 'day', 'ipo_date', 'open', 'close', 'diff', 'public_price_per_share', 'price_public_total']]
-    df['url'] = df['url'].apply(lambda x: x.split('/')[-1])
-    
-    for tuple in list(df.itertuples(index=False)):
-        # Get file coordinates
-        dir_name=tuple[0]
-        file_name=tuple[1]
-        volume=tuple[2]
-        day=tuple[3]
-        ipo_date=tuple[4]
-        open_price=tuple[5]
-        close=tuple[6]
-        diff=tuple[7]
-        public_price_per_share=tuple[8]
-        price_public_total=tuple[9]
-
-        # Fetch the file for parsing
-        file_path = try_to_get_file(dir_name, file_name) 
-
-        # File may not exist
-        if file_path == False:
-            continue
 
-        with open(file_path, 'r', encoding='utf-8') as file:
-            html_content= file.read()
+    # File locations come from the corpus index, filings that are not on disk have no path
+    with CorpusIndex() as corpus:
+        corpus.update()
+        df['url'] = corpus.paths(df)
+        df = df.rename(columns={'url': 'file_path'})
+
+        for tuple in list(df.itertuples(index=False)):
+            # Get file coordinates
+            dir_name=tuple[0]
+            file_path=tuple[1]
 
-        soup = BeautifulSoup(html_content, 'html.parser')
+            # File may not exist
+            if file_path is None:
+                continue
+
+            # One read and one parse, every extractor shares the same soup and text
+            prospectus = load_prospectus(file_path)
+
+            keyword_list = analyze_prospectus_keywords(prospectus.soup_text)
+            # Names and underwriters are only looked for in the sections that list them
+            name_sections = prospectus.section(NAME_SECTIONS) if sections_only else None
+            underwriting = (prospectus.section(UNDERWRITER_SECTIONS) if sections_only else None) or prospectus
+            names_list = extract_person_names(prospectus.soup_text, backend, name_sections.soup_text if name_sections else None)
+            underwriter_list = extract_underwriters(underwriting.soup, underwriting.html)
 
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
+            keyword_df = generate_keyword_dataframe(keyword_list)
+            names_df = generate_names_dataframe(names_list)
+            underwriter_df = generate_underwriter_dataframe(underwriter_list)
 
-        keyword_list = analyze_prospectus_keywords(soup)
-        names_list = extract_person_names(soup)
-        underwriter_list = extract_underwriters(soup, html_content)
+            triplets = generate_triplets(dir_name, keyword_df, names_df, underwriter_df)
+            write_dataset(triplets, f'./data/sec-ipo-files/{dir_name}/keyword_features')
+            builder.add_triplets(triplets)
+            corpus.mark_processed(file_path, 'keywords')
 
-        keyword_df = generate_keyword_dataframe(keyword_list)
-        names_df = generate_names_dataframe(names_list)
-        underwriter_df = generate_underwriter_dataframe(underwriter_list)
+            # Ipo day columns stay per filing, out of the feature matrix
+            documents.append({
+                'symbol': dir_name,
+                'Volume': tuple[2],
+                'Day': tuple[3],
+                'IPO_Date': tuple[4],
+                'Open': tuple[5],
+                'Close': tuple[6],
+                'Diff': tuple[7],
+                'Public_Price_Per_Share': tuple[8],
+                'Price_Public_Total': tuple[9]
+            })
 
-        df = pd.concat([keyword_df, names_df, underwriter_df], ignore_index=True)
-        pivoted_df = pivot_df(df)
-        pivoted_df['Volume'] = volume
-        pivoted_df['Day'] = day
-        pivoted_df['IPO_Date'] = ipo_date
-        pivoted_df['Open'] = open_price
-        pivoted_df['Close'] = close
-        pivoted_df['Diff'] = diff
-        pivoted_df['Public_Price_Per_Share'] = public_price_per_share
-        pivoted_df['Price_Public_Total'] = price_public_total
-        pivoted_df['symbol'] = dir_name
-        pivoted_df.to_csv(f'./data/sec-ipo-files/{dir_name}/word_analysis_2.csv', index=False)
-        all_dfs.append(pivoted_df)
+    matrix = builder.build()
+    matrix.save('./data/keyword_matrix')
+    write_dataset(pd.DataFrame(documents), './data/keyword_documents')
+    print(f'Keyword matrix: {matrix.shape[0]} filings x {matrix.shape[1]} features, {matrix.nnz} entries')
+    backend.report()
 
 
-    final_df = pd.concat(all_dfs)
-    final_df.to_csv(f'./data/full_eda.csv', index=False)
+def main():
+    parser = argparse.ArgumentParser(description='Count keywords, person names and underwriters in every prospectus into the keyword matrix')
+    parser.add_argument('--ner-backend', choices=list(NER_BACKENDS), default='nltk', help='person name finder, nltk is the most accurate and heuristic the fastest')
+    parser.add_argument('--sections-only', action='store_true', help='look for names and underwriters only in the sections that list them, changes the counts compared with a whole document scan')
+    args = parser.parse_args()
+
+    build_keyword_features(ner_backend=args.ner_backend, sections_only=args.sections_only)
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
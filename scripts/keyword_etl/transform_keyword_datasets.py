@@ -1,5 +1,9 @@
 import pandas as pd
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from stream_merge import bounded_map, drop_csv_columns
 
 def get_files_in_directory(directory):
     files = []
@@ -11,19 +15,18 @@ def get_low_count_keywords_list():
     file = './data/word_counts/word_count_summary.csv'
     return pd.read_csv(file)['column_name'].tolist()
 
-def remove_low_count_keywords(df):
-    low_count_keywords = get_low_count_keywords_list()
-    df = df.drop(low_count_keywords, axis=1, errors='ignore')
-    return df
-
 def main():
-    files = get_files_in_directory('./data/keyword_datasets')
+    files = [file for file in get_files_in_directory('./data/keyword_datasets') if os.path.isfile(file)]
     print(files)
 
-    for file in files:
+    # Low count columns are skipped while parsing, files are filtered a chunk at a time on a thread pool
+    low_count_keywords = set(get_low_count_keywords_list())
+    def remove_low_count_keywords_from_file(file):
         file_name = file.split('/')[-1]
-        df = pd.read_csv(file)
-        df = remove_low_count_keywords(df)
-        df.to_csv('./data/keyword_datasets/keywords_removed_' + file_name, index=False)
+        return drop_csv_columns(file, './data/keyword_datasets/keywords_removed_' + file_name, low_count_keywords)
+
+    for _ in bounded_map(remove_low_count_keywords_from_file, files):
+        pass
 
-main()
+if __name__ == '__main__':
+    main()
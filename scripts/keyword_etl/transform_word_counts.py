@@ -1,5 +1,11 @@
-import pandas as pd
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from stream_merge import counts_to_frame, sum_counts
+
+# Outputs written next to the per-filing counts, never read back as inputs
+OUTPUT_FILES = {'all.csv', 'word_count_summary.csv'}
 
 def get_files_in_directory(directory):
     files = []
@@ -7,26 +13,19 @@ def get_files_in_directory(directory):
         files.append(os.path.join(directory, filename))
     return files
 
-def concat_all_word_counts():
-    word_count_files = get_files_in_directory('./data/word_counts')
-
-    all_dfs = []
-    for file in word_count_files:
-        df = pd.read_csv(file)
-        all_dfs.append(df)
-
-    df = pd.concat(all_dfs)
-    df.to_csv('./data/word_counts/all.csv', index=False)
+def get_word_count_files():
+    return [file for file in get_files_in_directory('./data/word_counts') if os.path.basename(file) not in OUTPUT_FILES]
 
 def group_and_sum_word_counts():
-    df = pd.read_csv('./data/word_counts/all.csv')
-    df = df.groupby(['column_name'])['count'].sum().reset_index().sort_values('count', ascending=True)
+    # Summed straight from the per-filing files in a running total, all.csv is not needed
+    counts = sum_counts(get_word_count_files(), 'column_name', 'count')
+    df = counts_to_frame(counts, 'column_name', 'count')
     df.to_csv('./data/word_counts/word_count_summary.csv', index=False)
 
 
 def main():
-    concat_all_word_counts()
     group_and_sum_word_counts()
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
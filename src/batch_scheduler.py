@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def partition(items, weights=None, n_chunks=1):
+    """Split `items` into at most `n_chunks` contiguous chunks of about equal total weight.
+
+    Contiguous chunks keep the item order, so a change to one item only moves the chunks around it
+    and the checkpoints of the others stay valid.
+    """
+    items = list(items)
+    weights = [1] * len(items) if weights is None else [max(weight, 1) for weight in weights]
+    target = sum(weights) / max(n_chunks, 1)
+
+    chunks = []
+    chunk = []
+    total = 0
+    for item, weight in zip(items, weights):
+        chunk.append(item)
+        total += weight
+        if total >= target * (len(chunks) + 1) and len(chunks) < n_chunks - 1:
+            chunks.append(chunk)
+            chunk = []
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def safe_run_chunk(run_chunk, chunk, key, output_path):
+    try:
+        return key, run_chunk(chunk, output_path), None
+    except Exception as e:
+        return key, None, f'{type(e).__name__}: {e}'
+
+def chunk_key(chunk, version, state=None):
+    # Chunks are identified by what they hold and the code and input state they were built from
+    digest = hashlib.sha256()
+    digest.update(json.dumps([version, chunk, state], default=str).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class BatchScheduler:
+    """Runs a chunk function over balanced chunks of work in parallel, checkpointing each chunk.
+
+    `run_chunk(chunk, output_path)` must be a module-level function that writes the chunk's output to
+    `output_path` and returns the path it wrote. A chunk whose key is already in the checkpoint and
+    whose output still exists is not run again, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, checkpoint_dir, workers=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint.json')
+        self.workers = workers or os.cpu_count()
+        self.completed = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as file:
+                self.completed = json.load(file)
+
+    def save_checkpoint(self):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.completed, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def is_done(self, key):
+        output = self.completed.get(key)
+        return output is not None and os.path.exists(output)
+
+    def run(self, chunks, run_chunk, keys):
+        """Run every chunk not already done and return the output paths of all chunks in order."""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        pending = [(key, chunk) for key, chunk in zip(keys, chunks) if not self.is_done(key)]
+        print(f'{len(chunks) - len(pending)} of {len(chunks)} chunks already done, running {len(pending)}')
+
+        failures = []
+        for key, output, error in self.iter_run(pending, run_chunk):
+            if error is not None:
+                print(f'Chunk {key} failed: {error}')
+                failures.append(key)
+                continue
+            # Recorded as soon as a chunk finishes, so an interruption loses at most the running chunks
+            self.completed[key] = output
+            self.save_checkpoint()
+
+        if failures:
+            raise RuntimeError(f'{len(failures)} of {len(chunks)} chunks failed, rerun to retry them')
+        return [self.completed[key] for key in keys]
+
+    def iter_run(self, pending, run_chunk):
+        if self.workers <= 1:
+            for key, chunk in pending:
+                yield safe_run_chunk(run_chunk, chunk, key, self.chunk_path(key))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(safe_run_chunk, run_chunk, chunk, key, self.chunk_path(key)) for key, chunk in pending]
+
+            # Chunks are checkpointed in the order they finish, not the order they were submitted
+            for future in as_completed(futures):
+                yield future.result()
+
+    def chunk_path(self, key):
+        return os.path.join(self.checkpoint_dir, f'chunk_{key}')
+
+    def prune(self, keys):
+        # Drop outputs of chunks that are no longer part of the run
+        keys = set(keys)
+        for key in [key for key in self.completed if key not in keys]:
+            output = self.completed.pop(key)
+            if os.path.exists(output):
+                os.remove(output)
+        self.save_checkpoint()
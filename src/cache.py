@@ -0,0 +1,106 @@
+import hashlib
+import inspect
+import os
+import pickle
+
+CACHE_DIR = './data/cache'
+MAX_CACHE_BYTES = 5 * 1024 ** 3
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def code_version(*parts):
+    """Fingerprint of the code and config that produce a cached output.
+
+    Functions and modules contribute their source, everything else its repr, so editing a keyword
+    list or a regex invalidates exactly the stages that use it.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if callable(part):
+            part = inspect.unwrap(part)
+        if inspect.isfunction(part) or inspect.ismodule(part):
+            part = inspect.getsource(part)
+        digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class ExtractionCache:
+    """Content-addressed on-disk cache of per-filing outputs with a size cap and LRU eviction.
+
+    Entries are keyed by stage, a hash of the input file and the code version of that stage.
+    Reads bump the entry's mtime, and eviction removes the least recently used entries first.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+
+    def path(self, stage, input_hash, version):
+        return os.path.join(self.root, stage, input_hash[:2], f'{input_hash}-{version}.pkl')
+
+    def get(self, stage, input_hash, version):
+        path = self.path(stage, input_hash, version)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Mark as recently used
+        os.utime(path)
+        return value
+
+    def put(self, stage, input_hash, version, value):
+        path = self.path(stage, input_hash, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file first so a crashed worker never leaves a half written entry
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # An entry rewritten under the same key replaces its old size instead of adding to it
+        try:
+            old_size = os.path.getsize(path)
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp_path, path)
+
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self.entries())
+        else:
+            self.total_bytes += os.path.getsize(path) - old_size
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        for dir_path, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if not file_name.endswith('.pkl'):
+                    continue
+                stat = os.stat(os.path.join(dir_path, file_name))
+                yield os.path.join(dir_path, file_name), stat.st_size, stat.st_mtime
+
+    def evict(self):
+        # Oldest access first, drop entries until the cache is back under its cap
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+
+# Shared by every stage in a process
+extraction_cache = ExtractionCache()
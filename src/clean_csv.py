@@ -1,16 +1,17 @@
-from utils import column_has_numbers, is_date_in_row, regex_format_date, regex_format_number, to_snake_case
-from process_html import clean_html_file_and_stringify
+from utils import column_has_numbers, contains_date, format_dates, format_numbers, format_snake_case
+from document_metrics import document_metrics
+import numpy as np
 import pandas as pd
-import re
+
+# Cells holding only a currency sign or a dash, blanked out of every value column
+PLACEHOLDERS = ['$', '$—', '—']
 
 # First: Take the combined.csv file and clean out columns and rows -> combined_clean_01.csv
 def clean_out_columns_and_rows(df):
     for i,col in enumerate(df.columns):
         if i == 0:
             continue
-        df[col].replace('$', pd.NA, inplace=True)
-        df[col].replace('$—', pd.NA, inplace=True)
-        df[col].replace('—', pd.NA, inplace=True)
+        df[col].replace(PLACEHOLDERS, pd.NA, inplace=True)
         if not column_has_numbers(df[col]):
             df.drop(col, axis=1, inplace=True)
 
@@ -20,66 +21,90 @@ def clean_out_columns_and_rows(df):
 
 # Second: Locate the value and date from combined_clean_01 -> combined_clean_02
 def locate_value_and_date(df):
-    new_rows = []
-    column_dates = [None] * len(df.columns)
-    column_contexts = [None] * len(df.columns)  # Store the original date context
-    date_header_rows = []
-    
-    for row_idx, row in df.iterrows():
-        row_name = str(row.iloc[0]) if not pd.isna(row.iloc[0]) else ""
-
-        if is_date_in_row(row):
-            date_header_rows.append(row)
-            continue
-
-        # We hit a row with a symbol - process accumulated date headers
-        if date_header_rows:
-            # Combine date parts column-wise
-            for col_idx in range(len(df.columns)):
-                column_date_parts = []
-                
-                for header_row in date_header_rows:
-                    if col_idx < len(header_row) and not pd.isna(header_row.iloc[col_idx]):
-                        part = str(header_row.iloc[col_idx]).strip()
-                        if part:
-                            column_date_parts.append(part)
-                column_date_parts = [re.sub(r'\s+', ' ', date) for date in column_date_parts]
-                # Try to parse the combined parts as a date
-                if column_date_parts:
-                    combined_date_str = ' '.join(column_date_parts)
-                    date_match = regex_format_date(combined_date_str)
-                    
-                    if date_match:
-                        column_dates[col_idx] = date_match
-                        column_contexts[col_idx] = combined_date_str  # Store the context
-            
-            # Clear accumulated headers
-            date_header_rows = []
-        
-        # Process this data row for numbers
-        for col_idx, cell_value in enumerate(row):
-            if pd.isna(cell_value) or col_idx == 0:  # Skip NaN and first column
-                continue
-            
-            # Check if it's a number
-            number_value = None
-            if isinstance(cell_value, str):
-                number_value = regex_format_number(cell_value)
-            elif isinstance(cell_value, (int, float)):
-                number_value = cell_value
-            
-            # Add row if we have both date and number for this column
-            if number_value is not None and column_dates[col_idx] is not None:
-                new_rows.append({
-                    'symbol': row_name,
-                    'date': column_dates[col_idx],
-                    'context_date': column_contexts[col_idx],  # Add the context
-                    'value': number_value
-                })
-
-    if new_rows is None:
-        return None
-    return pd.DataFrame(new_rows)
+    n_rows, n_cols = df.shape
+    if n_rows == 0:
+        return pd.DataFrame()
+
+    # Long format of every non-empty cell, row by row then column by column
+    values = df.to_numpy(dtype=object)
+    rows, cols = np.nonzero(df.notna().to_numpy())
+    cells = pd.Series(values[rows, cols], dtype=object)
+
+    # A row is a date header when any of its cells holds a date
+    is_header_row = np.zeros(n_rows, dtype=bool)
+    is_header_row[rows[contains_date(cells).to_numpy()]] = True
+
+    # Header rows apply from the next data row on, number blocks by that data row
+    data_rank = np.cumsum(~is_header_row)
+    block = np.where(is_header_row, data_rank + 1, data_rank)
+    n_data_rows = int(data_rank[-1])
+    if n_data_rows == 0:
+        return pd.DataFrame()
+
+    # Combine date parts column-wise within each block of header rows
+    header = is_header_row[rows]
+    parts = cells[header].astype(str).str.strip()
+    parts = pd.DataFrame({
+        'block': block[rows[header]],
+        'col': cols[header],
+        'part': parts.str.replace(r'\s+', ' ', regex=True).to_numpy()
+    })
+    parts = parts[parts['part'] != '']
+    contexts = parts.groupby(['block', 'col'], sort=False)['part'].agg(' '.join).reset_index()
+    contexts['date'] = format_dates(contexts['part'])
+    contexts = contexts.dropna(subset=['date'])
+
+    # Each column keeps its last parsed date until a later header replaces it
+    data_blocks = pd.RangeIndex(1, n_data_rows + 1)
+    column_dates = (contexts.pivot(index='block', columns='col', values='date')
+                    .reindex(index=data_blocks, columns=range(n_cols)).ffill())
+    column_contexts = (contexts.pivot(index='block', columns='col', values='part')
+                       .reindex(index=data_blocks, columns=range(n_cols)).ffill())
+
+    # Value cells are non-empty, non-header cells past the first column
+    is_value = ~header & (cols > 0)
+    value_rows, value_cols = rows[is_value], cols[is_value]
+    value_cells = cells[is_value].reset_index(drop=True)
+
+    # Strings go through the number regex, numbers are kept as they are
+    numbers = format_numbers(value_cells)
+    is_str = value_cells.map(type).eq(str)
+    is_numeric = ~is_str & pd.to_numeric(value_cells.where(~is_str), errors='coerce').notna()
+    number_values = value_cells.where(~is_str, numbers)
+    has_number = (is_str & numbers.notna()) | is_numeric
+
+    value_blocks = block[value_rows] - 1
+    dates = column_dates.to_numpy(dtype=object)[value_blocks, value_cols]
+    context_dates = column_contexts.to_numpy(dtype=object)[value_blocks, value_cols]
+    keep = has_number.to_numpy() & pd.notna(dates)
+    if not keep.any():
+        return pd.DataFrame()
+
+    first_column = df.iloc[:, 0]
+    row_names = first_column.astype(str).where(first_column.notna(), '').to_numpy(dtype=object)
+
+    return pd.DataFrame({
+        'symbol': row_names[value_rows[keep]].tolist(),
+        'date': dates[keep].tolist(),
+        'context_date': context_dates[keep].tolist(),
+        'value': number_values[keep].tolist()
+    })
+
+FINANCE_KEYWORDS = [
+    'Revenue', 'Accounts Receivable', 'Earnings', 'Accounts Payable', 
+    'Liabilities', 'Assets', 'Expense', 'Interest',  # Added missing comma here
+    'Cash', 'Debt', 'Inventory', 'Earnings',
+    'Depreciation', 'Cost', 'Income',
+    'Inventories', 'Inventory', 'Land', 'Machinery', 'Equipment', 'Profit',  # Added missing comma
+    'Machinery', 'Equipment', 'Operating',
+    'Other Liabilities', 'Property', 'Sales', 'Loss',
+    # Add these keywords to match your CSV data:
+    'Deposits', 'Capital', 'Reserves', 'Interests', 'Deficit', 'Equity', 'Capitalization'
+]
+
+# Context dates kept by format_and_filter_rows: an exact "Month DD, YYYY", or any "Year End" or 'As of' variation
+CONTEXT_DATE_EXACT = r'^[A-Za-z]+\s+\d{1,2},\s+\d{4}$'
+CONTEXT_DATE_CONTAINS = [r'Years?\s+Ended?', r'Year?\s+Ended?', r'Year?\s\s+Ended?', r'As\s+of']
 
 # Third: Take the combined_clean_02.csv file and format it -> combined_clean_03.csv
 def format_and_filter_rows(df):
@@ -97,23 +122,11 @@ def format_and_filter_rows(df):
     df.loc[:,'context_date'] = df['context_date'].astype(str)
     df = df.sort_values(by=['symbol', 'date'])
 
-    finance_keywords = [
-        'Revenue', 'Accounts Receivable', 'Earnings', 'Accounts Payable', 
-        'Liabilities', 'Assets', 'Expense', 'Interest',  # Added missing comma here
-        'Cash', 'Debt', 'Inventory', 'Earnings',
-        'Depreciation', 'Cost', 'Income',
-        'Inventories', 'Inventory', 'Land', 'Machinery', 'Equipment', 'Profit',  # Added missing comma
-        'Machinery', 'Equipment', 'Operating',
-        'Other Liabilities', 'Property', 'Sales', 'Loss',
-        # Add these keywords to match your CSV data:
-        'Deposits', 'Capital', 'Reserves', 'Interests', 'Deficit', 'Equity', 'Capitalization'
-    ]
-
     # Lowercase the symbol column for consistent comparison
-    df['symbol'] = df['symbol'].apply(to_snake_case)
+    df['symbol'] = format_snake_case(df['symbol'])
 
     # Now use lowercase keywords for matching
-    finance_keywords_lower = [keyword.lower() for keyword in finance_keywords]
+    finance_keywords_lower = [keyword.lower() for keyword in FINANCE_KEYWORDS]
     df = df[df['symbol'].str.contains('|'.join(finance_keywords_lower), case=False, na=False)]
     df = df[df['symbol'].str.len() < 30]
 
@@ -121,61 +134,86 @@ def format_and_filter_rows(df):
     df = df.sort_values('value').drop_duplicates(subset=['symbol', 'date'], keep='last')
 
     # Part 1: Exact match for "Month DD, YYYY" format
-    date_exact = df['context_date'].str.match(r'^[A-Za-z]+\s+\d{1,2},\s+\d{4}$', case=False, na=False)
-
-    # Part 2: Contains match for "Year End" variations
-    year_end_contains = df['context_date'].str.contains(r'Years?\s+Ended?', case=False, na=False, regex=True)
-    
-    year_end_contains_singular = df['context_date'].str.contains(r'Year?\s+Ended?', case=False, na=False, regex=True)
-    
-    year_end_contains_double_space = df['context_date'].str.contains(r'Year?\s\s+Ended?', case=False, na=False, regex=True)
+    date_exact = df['context_date'].str.match(CONTEXT_DATE_EXACT, case=False, na=False)
 
-    # Part 3: Contains match for 'As of' variations
-    as_of_contains = df['context_date'].str.contains(r'As\s+of', case=False, na=False, regex=True)
+    # Part 2 and 3: Contains match for "Year End" and 'As of' variations
+    context_contains = [df['context_date'].str.contains(pattern, case=False, na=False, regex=True) for pattern in CONTEXT_DATE_CONTAINS]
 
     # Combine conditions with OR
-    df = df[date_exact | year_end_contains | as_of_contains | year_end_contains_singular | year_end_contains_double_space]
+    df = df[np.logical_or.reduce([date_exact] + context_contains)]
     df = df.sort_values(['symbol', 'date'])
 
     return df
 
-# Fourth: Calculate trend and recent
-def calculate_trend_and_recent(df):
-    new_df = pd.DataFrame() 
-    for name, group in df.groupby('symbol'):
-        first_value = group['value'].iloc[0]
-        last_value = group['value'].iloc[-1]
-        diff = last_value - first_value
-
-        new_trend_row = pd.DataFrame({
-            'symbol': f'{name}_trend',
-            'value': [diff]
-        })
-        new_recent_row = pd.DataFrame({
-            'symbol': f'{name}_recent',
-            'value': [last_value]
-        })
-
-        new_df = pd.concat([new_df, new_trend_row, new_recent_row], ignore_index=True)
-    
-    return new_df
-
-# Fifth: Pivot
-def pivot_df(df):
-    current_cols = df.set_index('symbol')['value']
-    result = pd.concat([current_cols]).to_frame().T
+# Fourth: Aggregate each line item into features, one wide row ready for the dataset
+def group_stats(df):
+    df = df.dropna(subset=['symbol'])
+    values = pd.to_numeric(df['value'], errors='coerce')
+    dates = pd.to_datetime(df['date'], errors='coerce')
+
+    # Rows are sorted by symbol and date, so first and last appearance are the oldest and newest values
+    first = df.drop_duplicates('symbol', keep='first').set_index('symbol')
+    last = df.drop_duplicates('symbol', keep='last').set_index('symbol')
+
+    grouped = values.groupby(df['symbol'])
+    stats = pd.DataFrame({
+        'first': pd.to_numeric(first['value'], errors='coerce'),
+        'last': pd.to_numeric(last['value'], errors='coerce'),
+        'first_date': pd.to_datetime(first['date'], errors='coerce'),
+        'last_date': pd.to_datetime(last['date'], errors='coerce'),
+        'min': grouped.min(),
+        'max': grouped.max(),
+        'periods': grouped.size()
+    }).sort_index()
+
+    # Least squares slope of value over time in years, from per-group sums
+    dated = dates.notna() & values.notna()
+    x = (dates[dated] - dates[dated].min()).dt.days / 365.25
+    y = values[dated]
+    sums = pd.DataFrame({'n': 1, 'x': x, 'y': y, 'xy': x * y, 'xx': x * x}).groupby(df['symbol'][dated]).sum()
+    denominator = sums['n'] * sums['xx'] - sums['x'] ** 2
+    stats['slope'] = ((sums['n'] * sums['xy'] - sums['x'] * sums['y']) / denominator.where(denominator != 0))
+
+    return stats
+
+def calculate_cagr(stats):
+    years = (stats['last_date'] - stats['first_date']).dt.days / 365.25
+    valid = (years > 0) & (stats['first'] > 0) & (stats['last'] > 0)
+    cagr = (stats['last'] / stats['first']) ** (1 / years.where(valid)) - 1
+    return cagr.where(valid)
+
+FEATURES = {
+    'trend': lambda stats: stats['last'] - stats['first'],
+    'recent': lambda stats: stats['last'],
+    'first': lambda stats: stats['first'],
+    'min': lambda stats: stats['min'],
+    'max': lambda stats: stats['max'],
+    'periods': lambda stats: stats['periods'],
+    'slope': lambda stats: stats['slope'],
+    'cagr': calculate_cagr,
+}
+
+def calculate_trend_and_recent(df, features=('trend', 'recent')):
+    unknown = [f for f in features if f not in FEATURES]
+    if unknown:
+        raise ValueError(f'Unknown features {unknown}, choose from {list(FEATURES)}')
+
+    return stats_to_features(group_stats(df), features)
+
+def stats_to_features(stats, features=('trend', 'recent')):
+    # Shared with the polars engine, which computes the same stats for every filing in one query
+    wide = pd.DataFrame({f: FEATURES[f](stats) for f in features}, index=stats.index)
+
+    # Columns go symbol by symbol, each followed by its features: revenue_trend, revenue_recent, ...
+    columns = [f'{name}_{f}' for name in wide.index for f in features]
+    result = pd.DataFrame([wide.to_numpy(dtype=float).ravel()], columns=pd.Index(columns, name='symbol'), index=['value'])
     result = result.dropna(axis=1, how='any')
 
     return result
 
-# Sixth: Calculate IPO Prospectus Document Length
-def calculate_document_length(df, symbol):
-    file_name = df['url']
-    file_name = file_name.split('/')[-1]
-    file_path = f'./data/sec-ipo-files/{symbol}/{file_name}'
-    html_content = clean_html_file_and_stringify(file_path)
-    document_length = len(html_content)
-
-    df['document_length'] = document_length
+# Fifth: Calculate IPO Prospectus Document Length
+def calculate_document_length(df, symbol, url):
+    # Measured in one streaming pass and cached by file hash, shared with add_document_metrics
+    df['document_length'] = document_metrics(symbol, url).document_length
 
     return df 
@@ -0,0 +1,202 @@
+import time
+import numpy as np
+import pandas as pd
+from clean_csv import CONTEXT_DATE_CONTAINS, CONTEXT_DATE_EXACT, FINANCE_KEYWORDS, PLACEHOLDERS, stats_to_features
+from storage import dataset_exists, read_dataset
+from stream_merge import READ_WORKERS, bounded_map
+from utils import contains_date, format_dates, format_numbers, format_snake_case, parse_distinct
+
+try:
+    import polars as pl
+    HAS_POLARS = True
+except ImportError:
+    HAS_POLARS = False
+
+STAT_COLUMNS = ['first', 'last', 'first_date', 'last_date', 'min', 'max', 'periods', 'slope']
+
+def combined_path(dir_name):
+    return f'./data/sec-ipo-finance/{dir_name}/combined'
+
+def read_combined(dir_name):
+    file_path = combined_path(dir_name)
+    if not dataset_exists(file_path):
+        return None
+    return read_dataset(file_path)
+
+def table_cells(df):
+    # Row and column position of every non-empty cell, row by row then column by column
+    values = df.to_numpy(dtype=object)
+    rows, cols = np.nonzero(df.notna().to_numpy())
+    return rows, cols, values[rows, cols]
+
+def read_cells(dir_names, workers=READ_WORKERS):
+    """Every non-empty cell of every filing's combined table, in long format."""
+    filings, rows, cols, values = [], [], [], []
+    for filing, df in enumerate(bounded_map(read_combined, dir_names, workers)):
+        if df is None or df.columns.size == 0:
+            print(f'A: Combined file not converted into a df for {dir_names[filing]},')
+            continue
+        table_rows, table_cols, table_values = table_cells(df)
+        filings.append(np.full(len(table_rows), filing, dtype=np.int32))
+        rows.append(table_rows)
+        cols.append(table_cols)
+        values.append(table_values)
+
+    if not filings:
+        return None
+    return np.concatenate(filings), np.concatenate(rows), np.concatenate(cols), pd.Series(np.concatenate(values), dtype=object)
+
+def parse_cells(filings, rows, cols, values):
+    """The regex work of the pandas stages, done once over the whole corpus.
+
+    The patterns in utils are Python regexes, so they stay there and run once per distinct cell text
+    through parse_distinct. Everything after that is relational and is left to the polars plan.
+    """
+    is_str = values.map(type).eq(str).to_numpy()
+    text = values.astype(str)
+    # column_has_numbers parses string cells too, so '123' counts towards keeping a column
+    numeric = pd.to_numeric(values, errors='coerce').astype(float).to_numpy()
+
+    # Strings go through the number regex, numbers are kept as they are
+    number = np.where(is_str, format_numbers(values).to_numpy(), numeric)
+    return pl.DataFrame({
+        'filing': filings,
+        'row': rows.astype(np.int64),
+        'col': cols.astype(np.int64),
+        'numeric': numeric,
+        'placeholder': is_str & values.isin(PLACEHOLDERS).to_numpy(),
+        'has_date': contains_date(text).to_numpy(),
+        'text': text.tolist(),
+        'part': parse_distinct(text, lambda cells: cells.str.strip().str.replace(r'\s+', ' ', regex=True)).tolist(),
+        'number': number.astype(float),
+    }, nan_to_null=True)
+
+def map_strings(parse, return_dtype):
+    # Hands a polars column to one of the pandas parsers in utils and back
+    def apply(series):
+        parsed = parse(pd.Series(series.to_list(), dtype=object))
+        return pl.Series(series.name, parsed.astype(object).where(parsed.notna(), None).tolist(), dtype=return_dtype)
+    return apply
+
+def parse_context_dates(dates):
+    return pd.to_datetime(dates, format='mixed', errors='coerce')
+
+# First: clean out columns and rows
+def clean_cells(cells):
+    # Placeholders are blanked first, then a column is kept when any of its cells is numeric
+    has_numbers = pl.col('numeric').is_not_null().any().over('filing', 'col')
+    return cells.filter((pl.col('col') == 0) | (~pl.col('placeholder') & has_numbers))
+
+# Second: locate the value and date of every value cell
+def locate_values_and_dates(cells):
+    # A row is a date header when any of its cells holds a date
+    rows = (cells.group_by('filing', 'row')
+            .agg(is_header=pl.col('has_date').any(),
+                 row_name=pl.col('text').filter(pl.col('col') == 0).first())
+            .sort('filing', 'row'))
+
+    # Header rows apply from the next data row on, number blocks by that data row
+    data_rank = (~pl.col('is_header')).cast(pl.Int64).cum_sum().over('filing')
+    rows = rows.with_columns(
+        block=pl.when(pl.col('is_header')).then(data_rank + 1).otherwise(data_rank),
+        row_name=pl.col('row_name').fill_null('')
+    )
+    cells = cells.join(rows, on=['filing', 'row']).sort('filing', 'row', 'col')
+
+    # Combine date parts column-wise within each block of header rows
+    contexts = (cells.filter(pl.col('is_header') & (pl.col('part') != ''))
+                .group_by('filing', 'block', 'col', maintain_order=True)
+                .agg(context_date=pl.col('part').str.join(' '))
+                .with_columns(date=pl.col('context_date').map_batches(map_strings(format_dates, pl.String), return_dtype=pl.String))
+                .drop_nulls('date')
+                .sort('block'))
+
+    # Each column keeps its last parsed date until a later header replaces it
+    values = (cells.filter(~pl.col('is_header') & (pl.col('col') > 0) & pl.col('number').is_not_null())
+              .sort('block')
+              # Both sides are sorted on block above, polars can only check that without the by groups
+              .join_asof(contexts, on='block', by=['filing', 'col'], strategy='backward', check_sortedness=False)
+              .drop_nulls('date')
+              .sort('filing', 'row', 'col'))
+
+    return values.select('filing', symbol='row_name', date='date', context_date='context_date', value='number')
+
+# Third: format the line items and keep the finance rows
+def format_and_filter(rows):
+    keywords = '|'.join(keyword.lower() for keyword in FINANCE_KEYWORDS)
+    context_dates = '|'.join([CONTEXT_DATE_EXACT] + CONTEXT_DATE_CONTAINS)
+
+    rows = (rows.unique(subset=['filing', 'symbol', 'value', 'context_date', 'date'], keep='first', maintain_order=True)
+            .with_columns(
+                date=pl.col('date').map_batches(map_strings(parse_context_dates, pl.Datetime('ns')), return_dtype=pl.Datetime('ns')),
+                symbol=(pl.col('symbol')
+                        .str.to_lowercase()
+                        .str.replace_all('[",\'\u2019:;().·]', '')  # Remove punctuation
+                        .str.replace_all(r'\s+', ' ')               # Clean up extra spaces
+                        .str.strip_chars())                         # Remove leading/trailing spaces
+            )
+            .sort('filing', 'symbol', 'date', nulls_last=True, maintain_order=True)
+            .with_columns(symbol=pl.col('symbol').map_batches(map_strings(format_snake_case, pl.String), return_dtype=pl.String))
+            .filter(pl.col('symbol').str.contains(f'(?i){keywords}') & (pl.col('symbol').str.len_chars() < 30)))
+
+    # Keep the largest value of each line item on each date
+    rows = (rows.sort('value', maintain_order=True)
+            .unique(subset=['filing', 'symbol', 'date'], keep='last', maintain_order=True)
+            .filter(pl.col('context_date').str.contains(f'(?i){context_dates}')))
+
+    return rows.sort('filing', 'symbol', 'date', nulls_last=True, maintain_order=True)
+
+# Fourth: aggregate each line item into the stats group_stats computes
+def aggregate_stats(rows):
+    # Least squares slope of value over time in years, from per-group sums
+    dated = pl.col('date').is_not_null()
+    years = (pl.col('date') - pl.col('date').min().over('filing')).dt.total_days() / 365.25
+    x = pl.when(dated).then(years)
+    y = pl.when(dated).then(pl.col('value'))
+
+    stats = (rows.group_by('filing', 'symbol', maintain_order=True)
+             .agg(first=pl.col('value').first(), last=pl.col('value').last(),
+                  first_date=pl.col('date').first(), last_date=pl.col('date').last(),
+                  min=pl.col('value').min(), max=pl.col('value').max(), periods=pl.len(),
+                  n=dated.sum(), x=x.sum(), y=y.sum(), xy=(x * y).sum(), xx=(x * x).sum()))
+
+    denominator = pl.col('n') * pl.col('xx') - pl.col('x') ** 2
+    slope = pl.when(denominator != 0).then((pl.col('n') * pl.col('xy') - pl.col('x') * pl.col('y')) / denominator)
+    return stats.with_columns(slope=slope).select('filing', 'symbol', *STAT_COLUMNS)
+
+def financial_features_plan(cells):
+    """clean -> locate -> format/filter -> aggregate as one lazy query over every filing at once."""
+    return aggregate_stats(format_and_filter(locate_values_and_dates(clean_cells(cells.lazy()))))
+
+def stats_frame(stats):
+    df = pd.DataFrame({column: stats[column].to_list() for column in STAT_COLUMNS}, index=pd.Index(stats['symbol'].to_list(), name='symbol'))
+    for column in ['first_date', 'last_date']:
+        df[column] = pd.to_datetime(df[column])
+    return df.astype({'first': float, 'last': float, 'min': float, 'max': float, 'slope': float}).sort_index()
+
+def financial_features(dir_names, features=('trend', 'recent'), workers=READ_WORKERS):
+    """clean_financial_features for many filings in one multi-threaded polars query.
+
+    Returns the wide feature row of every filing by name, or None for filings left without any
+    features, the same frames the pandas stages give one filing at a time.
+    """
+    if not HAS_POLARS:
+        raise ImportError('polars is required for the polars clean_csv engine')
+
+    dir_names = list(dir_names)
+    results = dict.fromkeys(dir_names)
+    start = time.perf_counter()
+    cells = read_cells(dir_names, workers)
+    if cells is None:
+        return results
+
+    stats = financial_features_plan(parse_cells(*cells)).collect()
+    for (filing,), filing_stats in stats.partition_by('filing', as_dict=True).items():
+        df = stats_to_features(stats_frame(filing_stats), features)
+        results[dir_names[filing]] = df if df.columns.size else None
+
+    for dir_name, df in results.items():
+        if df is None:
+            print(f'B-E: No financial features left after cleaning {dir_name},')
+    print(f'Cleaned {len(dir_names)} filings with polars in {time.perf_counter() - start:.1f}s')
+    return results
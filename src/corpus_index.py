@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from file_reader import MappedDocument, SNIFF_BYTES
+
+CORPUS_ROOT = './data/sec-ipo-files'
+INDEX_PATH = './data/corpus_index.sqlite'
+SUMMARY_PATH = './data/ipo_day_summary.csv'
+DOCUMENT_EXTENSIONS = ('.htm', '.html')
+HASH_WORKERS = 8
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS filings (
+    path TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    url TEXT,
+    accession TEXT,
+    form_type TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha256 TEXT,
+    encoding TEXT,
+    indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS filings_symbol ON filings (symbol, file_name);
+CREATE TABLE IF NOT EXISTS processed (
+    path TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    processed_at REAL,
+    PRIMARY KEY (path, stage)
+);
+'''
+
+# https://www.sec.gov/Archives/edgar/data/<cik>/<18 digit accession>/<file>
+accession_pattern = re.compile(r'/edgar/data/\d+/(\d{10})-?(\d{2})-?(\d{6})/')
+type_tag_pattern = re.compile(rb'<TYPE>\s*([^\s<]+)', re.IGNORECASE)
+# EDGAR file names end in the form: d123456ds1.htm, d123456df1a.htm, d123456d424b4.htm
+file_form_pattern = re.compile(r'(424b[1-8])|([sf])-?1(a?)\.html?$', re.IGNORECASE)
+
+def accession_from_url(url):
+    match = accession_pattern.search(url or '')
+    return '-'.join(match.groups()) if match else None
+
+def form_type(file_name, head):
+    match = type_tag_pattern.search(head)
+    if match:
+        return match.group(1).decode('ascii', errors='replace').upper()
+    match = file_form_pattern.search(file_name)
+    if match is None:
+        return None
+    if match.group(1):
+        return match.group(1).upper()
+    return f'{match.group(2).upper()}-1' + ('/A' if match.group(3) else '')
+
+def describe_file(path, file_name):
+    # One mapping of the file gives its hash, encoding and form type
+    with MappedDocument(path) as document:
+        return hashlib.sha256(document.data).hexdigest(), document.encoding, form_type(file_name, document.data[:SNIFF_BYTES])
+
+def scan_corpus(root=CORPUS_ROOT):
+    """(symbol, file_name, path, size, mtime_ns) of every prospectus document, from one scandir walk."""
+    if not os.path.isdir(root):
+        return
+    with os.scandir(root) as symbol_entries:
+        for symbol_entry in symbol_entries:
+            if not symbol_entry.is_dir():
+                continue
+            with os.scandir(symbol_entry.path) as file_entries:
+                for file_entry in file_entries:
+                    if file_entry.is_file() and file_entry.name.lower().endswith(DOCUMENT_EXTENSIONS):
+                        stat = file_entry.stat()
+                        yield symbol_entry.name, file_entry.name, file_entry.path, stat.st_size, stat.st_mtime_ns
+
+def read_urls(summary_path=SUMMARY_PATH):
+    if not os.path.exists(summary_path):
+        return {}
+    df = pd.read_csv(summary_path, usecols=['symbol', 'url']).dropna()
+    return {(symbol, url.split('/')[-1]): url for symbol, url in df.itertuples(index=False)}
+
+
+class CorpusIndex:
+    """SQLite index of the prospectus files on disk and of when each stage last processed them.
+
+    Built by one directory scan and kept current by `update`, which only re-reads files whose size or
+    mtime moved. Stages look filings up here instead of rebuilding paths from ipo_day_summary.csv
+    and probing the disk for each one. Opening the index only builds it when it is missing, the build
+    entrypoints call `update` so files placed in the corpus by any means are found.
+    """
+
+    def __init__(self, path=INDEX_PATH, root=CORPUS_ROOT, build=True):
+        self.path = path
+        self.root = root
+        is_new = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        # A missing index is built on first use
+        if build and is_new and os.path.isdir(root):
+            self.update()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, summary_path=SUMMARY_PATH, workers=HASH_WORKERS):
+        """Rescan the corpus: index new and changed files, drop vanished ones. Returns the counts."""
+        start = time.perf_counter()
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in self.connection.execute('SELECT path, size, mtime_ns FROM filings')}
+        urls = read_urls(summary_path)
+
+        seen = set()
+        changed = []
+        for symbol, file_name, path, size, mtime_ns in scan_corpus(self.root):
+            seen.add(path)
+            if known.get(path) != (size, mtime_ns):
+                changed.append((symbol, file_name, path, size, mtime_ns))
+
+        # Hashing releases the GIL, so changed files are read side by side
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            descriptions = list(executor.map(lambda row: describe_file(row[2], row[1]), changed))
+
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO filings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (path, symbol, file_name, urls.get((symbol, file_name)), accession_from_url(urls.get((symbol, file_name))),
+                     form, size, mtime_ns, sha256, encoding, now)
+                    for (symbol, file_name, path, size, mtime_ns), (sha256, encoding, form) in zip(changed, descriptions)
+                ]
+            )
+            # Urls can change in the summary without the file changing
+            self.connection.executemany(
+                'UPDATE filings SET url = ?, accession = ? WHERE symbol = ? AND file_name = ?',
+                [(url, accession_from_url(url), symbol, file_name) for (symbol, file_name), url in urls.items()]
+            )
+            removed = [(path,) for path in known if path not in seen]
+            self.connection.executemany('DELETE FROM filings WHERE path = ?', removed)
+            self.connection.executemany('DELETE FROM processed WHERE path = ?', removed)
+
+        counts = {'indexed': len(seen), 'changed': len(changed), 'removed': len(removed)}
+        print(f"Corpus index: {counts['indexed']} filings, {counts['changed']} new or changed, {counts['removed']} removed in {time.perf_counter() - start:.1f}s")
+        return counts
+
+    def find(self, symbol, file_name=None):
+        """Path of a symbol's filing, or None when it is not on disk."""
+        if file_name is None:
+            row = self.connection.execute('SELECT path FROM filings WHERE symbol = ? ORDER BY file_name LIMIT 1', (symbol,)).fetchone()
+        else:
+            row = self.connection.execute('SELECT path FROM filings WHERE symbol = ? AND file_name = ?', (symbol, file_name)).fetchone()
+        return row[0] if row else None
+
+    def filings(self):
+        return pd.read_sql_query('SELECT * FROM filings ORDER BY symbol, file_name', self.connection)
+
+    def paths(self, df, symbol_column='symbol', file_column='url'):
+        """Indexed path for every (symbol, file name or url) row of a frame, None where not on disk."""
+        lookup = {(symbol, file_name): path for symbol, file_name, path in self.connection.execute('SELECT symbol, file_name, path FROM filings')}
+        file_names = df[file_column].astype(str).str.split('/').str[-1]
+        return pd.Series([lookup.get(key) for key in zip(df[symbol_column], file_names)], index=df.index, dtype=object)
+
+    def mark_processed(self, path, stage, processed_at=None):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO processed VALUES (?, ?, ?)', (path, stage, processed_at or time.time()))
+
+    def last_processed(self, path, stage):
+        row = self.connection.execute('SELECT processed_at FROM processed WHERE path = ? AND stage = ?', (path, stage)).fetchone()
+        return row[0] if row else None
+
+    def unprocessed(self, stage):
+        """Paths a stage has never processed, or that changed on disk since it last did."""
+        rows = self.connection.execute(
+            '''SELECT filings.path FROM filings LEFT JOIN processed ON processed.path = filings.path AND processed.stage = ?
+               WHERE processed.processed_at IS NULL OR processed.processed_at < filings.indexed_at
+               ORDER BY filings.symbol, filings.file_name''',
+            (stage,)
+        )
+        return [row[0] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or refresh the index of prospectus files on disk')
+    parser.add_argument('--root', default=CORPUS_ROOT, help='directory of per-symbol prospectus folders')
+    parser.add_argument('--index', default=INDEX_PATH, help='sqlite file to write the index to')
+    args = parser.parse_args()
+
+    with CorpusIndex(args.index, args.root, build=False) as corpus:
+        corpus.update()
+
+if __name__ == '__main__':
+    main()
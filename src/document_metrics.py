@@ -0,0 +1,145 @@
+import hashlib
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from cache import extraction_cache, code_version
+from file_reader import MappedDocument
+from html_text import count_words_and_chars, split_chunks
+from prospectus import html_token_pattern, load_prospectus, normalize_token, normalize_tokens, prospectus_path
+import html_text
+
+DocumentMetrics = namedtuple('DocumentMetrics', ['byte_size', 'document_length', 'word_count'])
+MISSING_METRICS = DocumentMetrics(np.nan, np.nan, np.nan)
+
+
+def first_open_comment(tokens):
+    # A comment opener with no closer yet may still close in a later chunk and swallow what follows it
+    for i, token in enumerate(tokens):
+        if token.startswith('<!--') and not (token.endswith('-->') and len(token) >= 7):
+            return i
+    return None
+
+
+class NormalizedLengthCounter:
+    """Length of normalize_html(html) for html fed a chunk at a time, without building the output.
+
+    Each chunk is tokenised up to the point more html could change its tokens, the rest is carried
+    into the next chunk, so the count equals that of normalising the whole document at once.
+    """
+
+    def __init__(self):
+        self.length = 0
+        self.carry = ''
+
+    def feed(self, html_chunk):
+        parts = html_token_pattern.split(self.carry + html_chunk)
+        open_comment = first_open_comment(parts[1::2])
+        if open_comment is not None:
+            # Everything from the open comment on waits for the next chunk
+            cut = 2 * open_comment + 1
+            self.count_parts(parts[:cut])
+            self.carry = ''.join(parts[cut:])
+            return
+
+        # Only a '<' in the trailing text can start a tag that ends in the next chunk
+        text = parts[-1]
+        tag_start = text.find('<')
+        if tag_start == -1:
+            tag_start = len(text)
+        self.count_parts(parts[:-1] + [text[:tag_start]])
+        self.carry = text[tag_start:]
+
+    def close(self):
+        self.count_parts(html_token_pattern.split(self.carry))
+        self.carry = ''
+        return self.length
+
+    def count_parts(self, parts):
+        tokens = parts[1::2]
+        if any('\0' in token for token in tokens):
+            tokens = [normalize_token(token) for token in tokens]
+        else:
+            tokens = normalize_tokens(tokens)
+        self.length += sum(map(len, parts[::2])) + sum(map(len, tokens))
+
+
+def measure_chunks(html_chunks):
+    """Normalised length and visible word count of a stream of html chunks in one pass."""
+    length_counter = NormalizedLengthCounter()
+
+    def tee():
+        for html_chunk in html_chunks:
+            length_counter.feed(html_chunk)
+            yield html_chunk
+
+    word_count, _ = count_words_and_chars(tee())
+    return length_counter.close(), word_count
+
+@lru_cache(maxsize=None)
+def metrics_version():
+    # The metrics change with this module, the text extraction or the tag normalisation
+    return code_version(sys.modules[__name__], html_text, normalize_tokens, normalize_token)
+
+def measure_document(file_path):
+    prospectus = load_prospectus(file_path)
+    with MappedDocument(file_path) as document:
+        file_hash = hashlib.sha256(document.data).hexdigest()
+        version = metrics_version()
+        metrics = extraction_cache.get('document_metrics', file_hash, version)
+        if metrics is not None:
+            return metrics
+
+        # Reuse whatever this process has already parsed, stream the mapped file for the rest
+        if 'normalized_html' in prospectus.__dict__ and 'word_count' in prospectus.__dict__:
+            document_length, word_count = len(prospectus.normalized_html), prospectus.word_count
+        elif 'html' in prospectus.__dict__:
+            document_length, word_count = measure_chunks(split_chunks(prospectus.html))
+        else:
+            document_length, word_count = measure_chunks(document.iter_text())
+        metrics = DocumentMetrics(document.size, document_length, word_count)
+
+    extraction_cache.put('document_metrics', file_hash, version, metrics)
+    return metrics
+
+def safe_measure_document(file_path):
+    try:
+        return measure_document(file_path)
+    except FileNotFoundError:
+        print(f'File not found: {file_path}')
+        return MISSING_METRICS
+    except (OSError, UnicodeError, ValueError) as e:
+        # Runs inside a worker process, one unreadable filing must not take down the whole pool
+        print(f'Failed on {file_path}: {type(e).__name__}: {e}')
+        return MISSING_METRICS
+
+def prospectus_paths(df):
+    # Same paths as prospectus_path, built column-wise
+    return './data/sec-ipo-files/' + df['symbol'].astype(str) + '/' + df['url'].astype(str).str.split('/').str[-1]
+
+def add_document_metrics(df, columns=('document_length', 'word_count'), workers=None):
+    """Add document metrics columns (any of byte_size, document_length, word_count) to a dataset
+    with symbol and url columns. Each distinct filing is measured once, spread over `workers`
+    processes."""
+    paths = prospectus_paths(df)
+    unique_paths = list(paths.unique())
+    workers = workers or os.cpu_count()
+
+    if workers <= 1 or len(unique_paths) <= 1:
+        results = [safe_measure_document(file_path) for file_path in unique_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(unique_paths) // (workers * 4))
+            results = list(executor.map(safe_measure_document, unique_paths, chunksize=chunksize))
+
+    # Nullable integers, so a missing filing does not turn every count into a float
+    metrics = pd.DataFrame(results, index=unique_paths, columns=DocumentMetrics._fields).astype('Int64')
+    for column in columns:
+        df[column] = paths.map(metrics[column]).astype('Int64')
+    return df
+
+def document_metrics(symbol, url):
+    return measure_document(prospectus_path(symbol, url))
@@ -1,10 +1,10 @@
-from utils import create_df_from_csv
+from storage import read_dataset
 import pandas as pd
 
 
 def join_keywords_with_financials(fin_df, keyword_df):
-    fin_df = create_df_from_csv("./data/all_financial_reduced.csv")
-    keyword_df = create_df_from_csv('./datasets/keyword_analysis_with_url.csv')
+    fin_df = read_dataset("./data/all_financial_reduced")
+    keyword_df = read_dataset('./datasets/keyword_analysis_with_url')
     joined_df = join_keywords_with_financials(fin_df, keyword_df)
     # joined_df.to_csv('./data/all_financial_with_keywords.csv', index=False)
     return joined_df
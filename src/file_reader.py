@@ -0,0 +1,139 @@
+import codecs
+import mmap
+import os
+import re
+from functools import cached_property
+from io import BytesIO
+
+# Longest BOM first, the UTF-32 little endian BOM starts with the UTF-16 one
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Browsers read latin-1 and ascii labels as windows-1252, EDGAR filings rely on that too
+ENCODING_ALIASES = {'iso-8859-1': 'cp1252', 'latin-1': 'cp1252', 'latin1': 'cp1252', 'ascii': 'cp1252', 'us-ascii': 'cp1252'}
+
+# Tried in order after whatever the file declares, latin-1 decodes any byte so it always succeeds
+FALLBACK_ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+
+SNIFF_BYTES = 16 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+meta_charset_pattern = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([A-Za-z0-9_.:\-]+)', re.IGNORECASE)
+
+def normalize_encoding(name):
+    name = name.strip().lower()
+    name = ENCODING_ALIASES.get(name, name)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def sniff_encoding(head):
+    """Encoding from a byte order mark or a <meta> charset in the first bytes of a document."""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, True
+
+    match = meta_charset_pattern.search(head)
+    if match:
+        encoding = normalize_encoding(match.group(1).decode('ascii'))
+        if encoding:
+            return encoding, False
+    return None, False
+
+def decodes_cleanly(head, encoding):
+    # Not final, so a character cut off at the end of the head is left pending instead of failing
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        decoder.decode(head)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def detect_encoding(data):
+    """A BOM is trusted as is. A declared charset is checked against the first bytes first, because
+    filings labelled utf-8 often carry windows-1252 punctuation."""
+    head = data[:SNIFF_BYTES]
+    encoding, from_bom = sniff_encoding(head)
+    if from_bom:
+        return encoding
+
+    candidates = ([encoding] if encoding else []) + FALLBACK_ENCODINGS
+    for candidate in dict.fromkeys(candidates):
+        if decodes_cleanly(head, candidate):
+            return candidate
+    return 'latin-1'
+
+
+class MappedDocument:
+    """An EDGAR document memory-mapped from disk, with its encoding sniffed on first use.
+
+    The bytes are never copied into Python: `text` decodes in one go, `iter_text` decodes a chunk at
+    a time, and `lxml_source` hands the mapping itself to lxml together with `encoding`. Only the
+    first SNIFF_BYTES are checked against the encoding, bytes past them that do not fit it decode to
+    U+FFFD instead of failing.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            self.data = b''
+        else:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @cached_property
+    def encoding(self):
+        return detect_encoding(self.data)
+
+    def text(self):
+        return codecs.decode(self.data, self.encoding, errors='replace')
+
+    def iter_text(self, chunk_size=CHUNK_SIZE):
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        for start in range(0, len(self.data), chunk_size):
+            chunk = decoder.decode(self.data[start:start + chunk_size])
+            if chunk:
+                yield chunk
+        chunk = decoder.decode(b'', final=True)
+        if chunk:
+            yield chunk
+
+    def lxml_source(self):
+        if not isinstance(self.data, mmap.mmap):
+            return BytesIO(self.data)
+        self.data.seek(0)
+        return self.data
+
+    @property
+    def lxml_encoding(self):
+        # libxml2 strips a BOM itself and has no name for utf-8-sig
+        return 'utf-8' if self.encoding == 'utf-8-sig' else self.encoding
+
+
+def read_document(file_path):
+    with MappedDocument(file_path) as document:
+        return document.text()
+
+def iter_document_text(file_path, chunk_size=CHUNK_SIZE):
+    with MappedDocument(file_path) as document:
+        yield from document.iter_text(chunk_size)
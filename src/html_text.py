@@ -0,0 +1,81 @@
+from html.parser import HTMLParser
+from file_reader import iter_document_text
+
+SKIP_TAGS = frozenset({'script', 'style'})
+CHUNK_SIZE = 1024 * 1024
+
+
+class TextStreamParser(HTMLParser):
+    """SAX style text extraction: keeps the text outside <script>/<style> as it is parsed.
+
+    Text is handed out with whitespace collapsed to single spaces. Adjacent text nodes join without a
+    separator, the way BeautifulSoup's get_text() joins them, so word counts agree with it.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.pending = []
+        self.emitted = False
+        self.pending_space = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+
+        words = data.split()
+        if not words:
+            self.pending_space = self.pending_space or bool(data)
+            return
+
+        if self.emitted and (self.pending_space or data[0].isspace()):
+            self.pending.append(' ')
+        self.pending.append(' '.join(words))
+        self.pending_space = data[-1].isspace()
+        self.emitted = True
+
+    def drain(self):
+        chunks, self.pending = self.pending, []
+        return chunks
+
+
+def read_chunks(file_path, chunk_size=CHUNK_SIZE):
+    # Decoded a chunk at a time from the memory-mapped file
+    return iter_document_text(file_path, chunk_size)
+
+def split_chunks(html_content, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(html_content), chunk_size):
+        yield html_content[start:start + chunk_size]
+
+def iter_text(html_chunks):
+    """Yield the visible text of a stream of html chunks, never holding all of it."""
+    parser = TextStreamParser()
+    for html_chunk in html_chunks:
+        parser.feed(html_chunk)
+        chunks = parser.drain()
+        if chunks:
+            yield ''.join(chunks)
+    parser.close()
+    chunks = parser.drain()
+    if chunks:
+        yield ''.join(chunks)
+
+def count_words_and_chars(html_chunks):
+    """Word and character count of the visible text in constant memory."""
+    words = 0
+    chars = 0
+    joins_previous = False
+    for chunk in iter_text(html_chunks):
+        # A word cut between two chunks is counted once
+        words += len(chunk.split()) - (joins_previous and not chunk[0].isspace())
+        chars += len(chunk)
+        joins_previous = not chunk[-1].isspace()
+    return words, chars
@@ -0,0 +1,146 @@
+import re
+from bisect import bisect_left
+
+
+def keyword_pattern(keyword, whole_word=True):
+    pattern = re.escape(keyword)
+    return r'\b' + pattern + r'\b' if whole_word else pattern
+
+def trie_pattern(keywords, end=''):
+    """One regex for many literals, factored on common prefixes so each position is tried once per
+    character instead of once per keyword. Longer keywords are preferred over their prefixes."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return render_trie(trie, end)
+
+def render_trie(node, end):
+    branches = [re.escape(char) + render_trie(child, end) for char, child in node.items() if char != '']
+    if '' in node:
+        branches.append(end)
+    if len(branches) == 1:
+        return branches[0]
+    return '(?:' + '|'.join(branches) + ')'
+
+
+class KeywordMatches:
+    """Offsets of every keyword found by one KeywordCounter scan of a document."""
+
+    def __init__(self, keywords, matches):
+        self.keywords = keywords
+        self.matches = matches
+
+    def offsets(self, keyword):
+        return self.matches.get(keyword, [])
+
+    def count(self, keyword):
+        return len(self.offsets(keyword))
+
+    def counts(self):
+        # Every keyword is reported, including the ones that were not found
+        return {keyword: self.count(keyword) for keyword in self.keywords}
+
+    def found(self):
+        return [keyword for keyword in self.keywords if self.matches.get(keyword)]
+
+    def near(self, keyword, terms, window):
+        """Offsets of `keyword` with one of `terms` entirely within `window` characters either side."""
+        term_spans = sorted(span for term in terms for span in self.offsets(term))
+        term_starts = [start for start, _ in term_spans]
+
+        hits = []
+        for start, end in self.offsets(keyword):
+            low, high = start - window, end + window
+            i = bisect_left(term_starts, low)
+            while i < len(term_spans) and term_spans[i][0] <= high:
+                if term_spans[i][1] <= high:
+                    hits.append((start, end))
+                    break
+                i += 1
+        return hits
+
+
+class KeywordCounter:
+    """Counts many keywords in a single scan of a document.
+
+    All keywords are compiled into one prefix-factored alternation inside a lookahead, so every start
+    position is tried once no matter how many keywords there are, and matches of different keywords
+    may overlap just as when each keyword was searched for on its own. Keywords are matched on word
+    boundaries unless listed in `substrings`.
+    """
+
+    def __init__(self, keywords, substrings=(), ignore_case=True):
+        self.keywords = list(dict.fromkeys(list(keywords) + list(substrings)))
+        self.ignore_case = ignore_case
+        flags = re.IGNORECASE if ignore_case else 0
+
+        self.patterns = {
+            keyword: re.compile(keyword_pattern(keyword, keyword not in substrings), flags)
+            for keyword in self.keywords
+        }
+        whole_words = [self.normalize(keyword) for keyword in self.keywords if keyword not in substrings]
+        parts = [self.normalize(keyword) for keyword in self.keywords if keyword in substrings]
+
+        alternatives = []
+        if whole_words:
+            alternatives.append(r'\b' + trie_pattern(whole_words, end=r'\b'))
+        if parts:
+            alternatives.append(trie_pattern(parts))
+        self.pattern = re.compile('(?=(' + '|'.join(alternatives) + '))', flags)
+        self.lookup = {self.normalize(keyword): keyword for keyword in self.keywords}
+
+        # The alternation reports one keyword per position, any keyword sharing a prefix with it is checked directly
+        self.overlapping = {}
+        for keyword in self.keywords:
+            normalized = self.normalize(keyword)
+            self.overlapping[keyword] = [
+                other for other in self.keywords
+                if other != keyword and (normalized.startswith(self.normalize(other)) or self.normalize(other).startswith(normalized))
+            ]
+
+    def normalize(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def resolve(self, text, start, matched):
+        keyword = self.lookup.get(self.normalize(matched))
+        if keyword is not None:
+            return keyword
+
+        # The regex folds case per character, so text like 'ſaas' or 'Aİ' can match a keyword whose
+        # .lower() is a different string, find the keyword whose own pattern matches the same span
+        end = start + len(matched)
+        for keyword in self.keywords:
+            keyword_match = self.patterns[keyword].match(text, start)
+            if keyword_match and keyword_match.end() == end:
+                return keyword
+        return None
+
+    def scan(self, text):
+        matches = {keyword: [] for keyword in self.keywords}
+
+        def add(keyword, start, end):
+            # Same keyword never overlaps itself, like re.findall
+            spans = matches[keyword]
+            if not spans or spans[-1][1] <= start:
+                spans.append((start, end))
+
+        for match in self.pattern.finditer(text):
+            start = match.start()
+            matched = match.group(1)
+            keyword = self.resolve(text, start, matched)
+            if keyword is None:
+                continue
+            add(keyword, start, start + len(matched))
+
+            for other in self.overlapping[keyword]:
+                other_match = self.patterns[other].match(text, start)
+                if other_match:
+                    add(other, start, other_match.end())
+
+        return KeywordMatches(self.keywords, matches)
+
+    def count(self, text):
+        return self.scan(text).counts()
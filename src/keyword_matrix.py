@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+from storage import read_dataset, write_dataset
+
+try:
+    from scipy import sparse
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+TRIPLET_COLUMNS = ['symbol', 'element_name', 'data_type', 'value']
+
+# Filings per block in iter_dense, a block is as wide as the whole vocabulary
+DENSE_CHUNK_ROWS = 256
+
+def wide_to_triplets(df, symbol, exclude=()):
+    """Long (symbol, element_name, data_type, value) rows from one filing's wide keyword row."""
+    values = df.drop(columns=[col for col in exclude if col in df.columns]).iloc[0]
+    values = pd.to_numeric(values, errors='coerce').dropna()
+    return pd.DataFrame({
+        'symbol': symbol,
+        'element_name': values.index.astype(str),
+        'data_type': None,
+        'value': values.to_numpy(dtype=float)
+    }, columns=TRIPLET_COLUMNS)
+
+
+class KeywordMatrix:
+    """Sparse symbol x feature matrix of keyword, person and underwriter counts.
+
+    Entries are kept as (row, column, value) triplets over a vocabulary of feature names, so a filing
+    only costs memory for the features it actually mentions. A wide frame is only ever built by
+    `to_dense`, and only for the columns asked for, or a block of filings at a time by `iter_dense`.
+    """
+
+    def __init__(self, symbols, vocabulary, data_types, rows, cols, values):
+        self.symbols = pd.Index(symbols, name='symbol')
+        self.vocabulary = pd.Index(vocabulary, name='element_name')
+        self.data_types = np.asarray(data_types, dtype=object)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.values = np.asarray(values, dtype=float)
+
+    @property
+    def shape(self):
+        return len(self.symbols), len(self.vocabulary)
+
+    @property
+    def nnz(self):
+        return len(self.values)
+
+    @classmethod
+    def from_triplets(cls, df):
+        # A name found twice in one filing keeps its first value, like the old per-filing pivot
+        df = df.dropna(subset=['symbol', 'element_name', 'value'])
+        df = df.drop_duplicates(subset=['symbol', 'element_name'], keep='first')
+
+        rows, symbols = pd.factorize(df['symbol'])
+        cols, vocabulary = pd.factorize(df['element_name'])
+        data_types = df['data_type'].to_numpy(dtype=object)
+        first_seen = np.unique(cols, return_index=True)[1]
+        return cls(symbols, vocabulary, data_types[first_seen], rows, cols, df['value'])
+
+    def to_triplets(self):
+        return pd.DataFrame({
+            'symbol': self.symbols.to_numpy()[self.rows],
+            'element_name': self.vocabulary.to_numpy()[self.cols],
+            'data_type': self.data_types[self.cols],
+            'value': self.values
+        }, columns=TRIPLET_COLUMNS)
+
+    def document_frequency(self):
+        # Number of filings that report each feature, what DataFrame.count() gave on the wide frame
+        counts = np.bincount(self.cols, minlength=len(self.vocabulary))
+        return pd.Series(counts, index=self.vocabulary, name='count')
+
+    def select_columns(self, keep):
+        """New matrix restricted to the features where the boolean mask `keep` is True."""
+        keep = np.asarray(keep, dtype=bool)
+        new_cols = np.full(len(self.vocabulary), -1, dtype=np.int64)
+        new_cols[keep] = np.arange(keep.sum())
+
+        entries = keep[self.cols]
+        return KeywordMatrix(self.symbols, self.vocabulary[keep], self.data_types[keep],
+                             self.rows[entries], new_cols[self.cols[entries]], self.values[entries])
+
+    def drop_columns(self, columns):
+        return self.select_columns(~self.vocabulary.isin(columns))
+
+    def prune(self, min_df=1, max_df=None):
+        """Drop features reported by fewer than `min_df` (or more than `max_df`) filings."""
+        frequency = self.document_frequency().to_numpy()
+        keep = frequency >= min_df
+        if max_df is not None:
+            keep &= frequency <= max_df
+        return self.select_columns(keep)
+
+    def to_dense(self, columns=None, fill_value=np.nan):
+        """Wide symbol x feature DataFrame, built only for `columns` (every feature when None)."""
+        matrix = self if columns is None else self.select_columns(self.vocabulary.isin(columns))
+        dense = np.full(matrix.shape, fill_value, dtype=float)
+        dense[matrix.rows, matrix.cols] = matrix.values
+
+        df = pd.DataFrame(dense, index=matrix.symbols, columns=matrix.vocabulary)
+        if columns is not None:
+            df = df.reindex(columns=[col for col in columns if col in df.columns])
+        return df
+
+    def iter_dense(self, chunk_rows=DENSE_CHUNK_ROWS, fill_value=np.nan):
+        """Wide symbol x feature DataFrames of `chunk_rows` filings each, in symbol order."""
+        order = np.argsort(self.rows, kind='stable')
+        rows, cols, values = self.rows[order], self.cols[order], self.values[order]
+        for start in range(0, len(self.symbols), chunk_rows):
+            stop = min(start + chunk_rows, len(self.symbols))
+            low, high = np.searchsorted(rows, [start, stop])
+            dense = np.full((stop - start, len(self.vocabulary)), fill_value, dtype=float)
+            dense[rows[low:high] - start, cols[low:high]] = values[low:high]
+            yield pd.DataFrame(dense, index=self.symbols[start:stop], columns=self.vocabulary)
+
+    def to_csr(self):
+        if not HAS_SCIPY:
+            raise ImportError('scipy is required for KeywordMatrix.to_csr')
+        return sparse.csr_matrix((self.values, (self.rows, self.cols)), shape=self.shape)
+
+    def save(self, path):
+        return write_dataset(self.to_triplets(), path)
+
+    @classmethod
+    def load(cls, path, columns=None):
+        # With a column list only those features are read, pushed down into parquet
+        filters = [('element_name', 'in', list(columns))] if columns is not None else None
+        df = read_dataset(path, filters=filters)
+        if df is None:
+            return None
+        return cls.from_triplets(df)
+
+
+class KeywordMatrixBuilder:
+    """Accumulates filings one at a time into a KeywordMatrix without building any wide frame."""
+
+    def __init__(self):
+        self.symbols = {}
+        self.vocabulary = {}
+        self.data_types = []
+        self.rows = []
+        self.cols = []
+        self.values = []
+
+    def add(self, symbol, element_names, values, data_types=None):
+        row = self.symbols.setdefault(symbol, len(self.symbols))
+        if data_types is None:
+            data_types = [None] * len(element_names)
+
+        cols = []
+        for name, data_type in zip(element_names, data_types):
+            col = self.vocabulary.get(name)
+            if col is None:
+                col = self.vocabulary[name] = len(self.vocabulary)
+                self.data_types.append(data_type)
+            elif pd.isna(self.data_types[col]):
+                # Legacy wide rows carry no type, take it from the first filing that does
+                self.data_types[col] = data_type
+            cols.append(col)
+
+        self.rows.append(np.full(len(cols), row, dtype=np.int64))
+        self.cols.append(np.asarray(cols, dtype=np.int64))
+        self.values.append(np.asarray(values, dtype=float))
+
+    def add_triplets(self, df):
+        df = df.dropna(subset=['element_name', 'value'])
+        for symbol, group in df.groupby('symbol', sort=False):
+            self.add(symbol, group['element_name'].tolist(), group['value'].to_numpy(), group['data_type'].tolist())
+
+    def build(self):
+        if not self.values:
+            return KeywordMatrix([], [], [], [], [], [])
+
+        rows = np.concatenate(self.rows)
+        cols = np.concatenate(self.cols)
+        values = np.concatenate(self.values)
+
+        # Keep the first value of a feature repeated within one filing
+        _, first = np.unique(rows * len(self.vocabulary) + cols, return_index=True)
+        first.sort()
+        return KeywordMatrix(list(self.symbols), list(self.vocabulary), self.data_types,
+                             rows[first], cols[first], values[first])
@@ -0,0 +1,70 @@
+import json
+import os
+from cache import hash_file
+
+MANIFEST_PATH = './data/manifest.json'
+
+def file_state(file_path):
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+class BuildManifest:
+    """Per-symbol record of what each pipeline stage was last built from.
+
+    A stage is stale when its version changed, an output is missing, or an input changed. Inputs
+    are compared by size and mtime first and only re-hashed when those differ, so touching a file
+    without changing it does not trigger a rebuild.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file)
+
+    def is_stale(self, symbol, stage, inputs, version):
+        entry = self.entries.get(symbol, {}).get(stage)
+        if entry is None or entry['version'] != version:
+            return True
+        if any(not os.path.exists(output) for output in entry['outputs']):
+            return True
+
+        for input_path in inputs:
+            recorded = entry['inputs'].get(input_path)
+            state = file_state(input_path)
+            if recorded is None or state is None:
+                return True
+            if state['size'] == recorded['size'] and state['mtime'] == recorded['mtime']:
+                continue
+            if state['size'] != recorded['size'] or hash_file(input_path) != recorded['hash']:
+                return True
+
+            # Same content, only the mtime moved
+            recorded['mtime'] = state['mtime']
+        return False
+
+    def record(self, symbol, stage, inputs, version, outputs=()):
+        recorded_inputs = {}
+        for input_path in inputs:
+            state = file_state(input_path)
+            if state is None:
+                continue
+            state['hash'] = hash_file(input_path)
+            recorded_inputs[input_path] = state
+
+        self.entries.setdefault(symbol, {})[stage] = {
+            'version': version,
+            'inputs': recorded_inputs,
+            'outputs': [output for output in outputs if os.path.exists(output)]
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.path)
@@ -1,85 +1,73 @@
+import argparse
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from utils import make_new_dir, remove_empty_columns_from_df
 import pandas as pd
-from io import StringIO
-from bs4 import BeautifulSoup
+from prospectus import ParsedProspectus, load_prospectus, iter_html_tables, table_passes_prefilter, create_df_from_table_element
+from cache import extraction_cache, code_version, hash_file
+from storage import read_dataset, write_dataset
+import sections
 
 finance_keywords= ['Revenue', 'Accounts Receivable', 'Liabilities', 'Assets', 'Cash', 'Common Stock', 'Differed Tax', 'Inventory', 'Earnings', 'Operating Loss', 'Months Ended', 'Year Ended', 'Depreciation']
+# Financial tables live in the summary and selected financial data and in the F-pages
+FINANCE_SECTIONS = ('summary_financial_data', 'selected_financial_data', 'financial_statements')
 column_keywords = ['Six Months End', 'Twelve Months End', 'Year Ended', 'Six Months Ended', 'Twelve Months Ended', 'Years Ended', 'Years End', 'Period From']
 
 def clean_html_file_and_stringify(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        html_content= file.read()
-    
-    # Remove HTML comments
-    html_content = re.sub(r'<!--.*?-->', '', html_content, flags=re.DOTALL)
-
-    # Lowercase html tags
-    html_content = re.sub(r'<[^>]+>', lambda match: match.group(0).lower(), html_content)
+    return load_prospectus(file_path).normalized_html
 
-    # Uppercase Doctype tag
-    html_content = re.sub(r'<!doctype[^>]*>', lambda match: match.group(0).upper(), html_content)
+def clean_html_file_and_get_text(file_path):
+    return ''.join(iter_html_file_text(file_path))
 
-    # Make sure doctype is the first thing
-    html_content = re.sub(r'<!doctype[^>]*>(.*)', r'<!DOCTYPE \1>', html_content)
+def iter_html_file_text(file_path):
+    # Text chunks straight from the file, script and style skipped and whitespace collapsed
+    return load_prospectus(file_path).iter_text()
 
-    return html_content
+@lru_cache(maxsize=None)
+def build_keyword_matcher(keywords):
+    # One alternation for every keyword, longest first so overlapping keywords prefer the longer one
+    alternation = '|'.join(re.escape(k) for k in sorted(set(keywords), key=len, reverse=True))
+    return re.compile(alternation, re.IGNORECASE)
 
-def clean_html_file_and_get_text(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        html_content = file.read()
-    
-    # Use BeautifulSoup to parse and extract text content
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Remove script and style elements
-    for script in soup(["script", "style"]):
-        script.decompose()
-    
-    # Get text content
-    text = soup.get_text()
-    
-    # Clean up whitespace
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = ' '.join(chunk for chunk in chunks if chunk)
-    
-    return text
+def match_keywords_in_table(table, keywords):
+    matcher = build_keyword_matcher(tuple(keywords))
+    canonical = {k.lower(): k for k in keywords}
 
-def create_df_from_html_tables(html_content):
-    try:
-        df = pd.read_html(StringIO(html_content))
-    except ValueError as e:
-        if "No tables found" in str(e):
-            print("No HTML tables found in the file")
-            df = None
-        else:
-            print(f"ValueError: {e}")
-            df = None
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        df = None
-    return df
+    # Flatten every cell into one string and scan it once
+    table_text = '\n'.join(map(str, table.to_numpy().ravel()))
+    return {canonical[match.group(0).lower()] for match in matcher.finditer(table_text)}
 
 def find_finance_tables(df, finance_keywords):
     all_dfs = []
     for item in df:
-        for w in finance_keywords:
-            exists = item.astype(str).apply(lambda x: x.str.contains(w, case=False, na=False)).any().any()
-            if exists:
-                is_small = item.shape[0] < 4
-                if is_small:
-                    continue
-                all_dfs.append(item) 
+        is_small = item.shape[0] < 4
+        if is_small:
+            continue
+
+        matched_keywords = match_keywords_in_table(item, finance_keywords)
+        if matched_keywords:
+            item.attrs['finance_keywords'] = sorted(matched_keywords)
+            all_dfs.append(item)
 
     return all_dfs
 
-def extract_finance_tables_from_html(file_path, finance_keywords):
-    # Grab html file, clean it, and stringify it
-    html_content_string = clean_html_file_and_stringify(file_path)
+def extract_finance_tables_from_html(file_path, finance_keywords, sections_only=False):
+    # Parse the file once, the html is cached on the prospectus
+    prospectus = load_prospectus(file_path)
+
+    # With sections_only only the financial sections are searched, the whole file when the segmenter
+    # finds none of them. Finding the sections decodes the whole document, so it is opt-in
+    if sections_only:
+        html_tables = (prospectus.section(FINANCE_SECTIONS) or prospectus).iter_tables(finance_keywords)
+    else:
+        # lxml reads the memory mapped file, even when another extractor already decoded the html
+        html_tables = prospectus.iter_file_tables(finance_keywords)
 
-    # Find all the html tables in the file
-    html_table_dfs = create_df_from_html_tables(html_content_string)
+    # Stream the html tables, skipping tables without any finance keyword
+    html_table_dfs = list(html_tables)
     if html_table_dfs is None or len(html_table_dfs) == 0:
         return None
 
@@ -90,36 +78,122 @@ def extract_finance_tables_from_html(file_path, finance_keywords):
     
     return finance_table_dfs
 
+@lru_cache(maxsize=None)
+def extraction_version(sections_only=False):
+    # Whole document and section only runs find different tables, so they are cached apart
+    return code_version(
+        sections_only, finance_keywords, FINANCE_SECTIONS, sections, ParsedProspectus.section, ParsedProspectus.iter_file_tables,
+        iter_html_tables, table_passes_prefilter, create_df_from_table_element,
+        extract_finance_tables_from_html, find_finance_tables, match_keywords_in_table, build_keyword_matcher
+    )
+
 def save_each_finance_table_df(dir_name, finance_dfs):
     # Create folder if it doesn't exist to store data
     make_new_dir(f'./data/sec-ipo-finance/{dir_name}')
 
     # Save tables to folder
+    table_index = []
     for i,f_df in enumerate(finance_dfs):
         if isinstance(f_df.columns, pd.MultiIndex):
             f_df.columns = f_df.columns.to_flat_index()
             finance_dfs[i] = f_df
-        f_df.to_csv(f'./data/sec-ipo-finance/{dir_name}/{i}.csv', index=False)
+        write_dataset(f_df, f'./data/sec-ipo-finance/{dir_name}/{i}')
+        table_index.append({
+            'table': i,
+            'rows': f_df.shape[0],
+            'finance_keywords': '|'.join(f_df.attrs.get('finance_keywords', []))
+        })
+
+    # Record which keywords qualified each table
+    write_dataset(pd.DataFrame(table_index), f'./data/sec-ipo-finance/{dir_name}/tables')
 
 def generate_combined_financial_csv(dir_name, finance_dfs):
         combined_df = pd.concat(finance_dfs)
         final_df = remove_empty_columns_from_df(combined_df)
-        final_df.to_csv(f'./data/sec-ipo-finance/{dir_name}/combined.csv', index=False)
+        write_dataset(final_df, f'./data/sec-ipo-finance/{dir_name}/combined')
+
 
+def html_table_to_csv(dir_name, file_name, sections_only=False):
+    file_path = f'./data/sec-ipo-files/{dir_name}/{file_name}'
+    file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
 
-def html_tables_to_csv(dir_and_file_names_df):
-    for tuple in list(dir_and_file_names_df.itertuples(index=False)):
-        # Create File Path
-        dir_name=tuple[0]
-        file_name=tuple[1]
-        file_path = f'./data/sec-ipo-files/{dir_name}/{file_name}'
-        
+    # Reuse the tables from an earlier run when neither the file nor the extraction code changed
+    file_hash = hash_file(file_path)
+    version = extraction_version(sections_only)
+    finance_dfs = extraction_cache.get('tables', file_hash, version)
+    if finance_dfs is None:
         # Extract table data from html
-        finance_dfs = extract_finance_tables_from_html(file_path, finance_keywords)
-        if finance_dfs is None:
-            print(f'Could not create df from html file {dir_name}/{file_name}')
-            continue
-        
-        # Save files and combine frames for one unified dataframe
-        save_each_finance_table_df(dir_name, finance_dfs)
-        generate_combined_financial_csv(dir_name, finance_dfs)
+        finance_dfs = extract_finance_tables_from_html(file_path, finance_keywords, sections_only) or []
+        extraction_cache.put('tables', file_hash, version, finance_dfs)
+
+    if len(finance_dfs) == 0:
+        print(f'Could not create df from html file {dir_name}/{file_name}')
+        return False, file_size
+
+    # Save files and combine frames for one unified dataframe
+    save_each_finance_table_df(dir_name, finance_dfs)
+    generate_combined_financial_csv(dir_name, finance_dfs)
+    return True, file_size
+
+def safe_html_table_to_csv(dir_name, file_name, sections_only=False):
+    # Runs inside a worker process, a bad filing must not take down the whole pool
+    try:
+        saved, file_size = html_table_to_csv(dir_name, file_name, sections_only)
+        return dir_name, saved, file_size, None
+    except Exception as e:
+        return dir_name, False, 0, f'{type(e).__name__}: {e}'
+
+def report_throughput(files_done, bytes_done, failures, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    print(f'Processed {files_done} files ({bytes_done / 1e6:.1f} MB) in {elapsed:.1f}s, {len(failures)} failed')
+    print(f'Throughput: {files_done / elapsed:.2f} files/s, {bytes_done / 1e6 / elapsed:.2f} MB/s')
+
+def iter_html_tables_to_csv(rows, workers, sections_only=False):
+    if workers <= 1:
+        for dir_name, file_name in rows:
+            yield safe_html_table_to_csv(dir_name, file_name, sections_only)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(safe_html_table_to_csv, dir_name, file_name, sections_only) for dir_name, file_name in rows]
+
+        # Stream results back as each filing finishes, not in submission order
+        for future in as_completed(futures):
+            yield future.result()
+
+def html_tables_to_csv(dir_and_file_names_df, workers=1, sections_only=False):
+    """Extract the finance tables of every filing. Returns the symbols that saved tables and those that failed."""
+    rows = [(tuple[0], tuple[1]) for tuple in dir_and_file_names_df.itertuples(index=False)]
+    files_done = 0
+    bytes_done = 0
+    saved_dirs = []
+    failures = []
+    start = time.perf_counter()
+
+    for dir_name, saved, file_size, error in iter_html_tables_to_csv(rows, workers, sections_only):
+        files_done += 1
+        bytes_done += file_size
+        if saved:
+            saved_dirs.append(dir_name)
+        if error is not None:
+            print(f'Failed on {dir_name}: {error}')
+            failures.append(dir_name)
+
+    report_throughput(files_done, bytes_done, failures, time.perf_counter() - start)
+    return saved_dirs, failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract finance tables from SEC ipo prospectus html files into csv files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes, 1 runs serially')
+    parser.add_argument('--ipo-list', default='./datasets/keyword_analysis_with_url.csv', help='dataset with symbol and url columns')
+    parser.add_argument('--sections-only', action='store_true', help='look for finance tables only in the summary, selected financial data and financial statement sections, changes the tables found compared with a whole document scan')
+    args = parser.parse_args()
+
+    ipo_list = read_dataset(args.ipo_list)
+    ipo_list = ipo_list[['symbol', 'url']]
+    ipo_list['url'] = ipo_list['url'].apply(lambda x: x.split('/')[-1])
+
+    html_tables_to_csv(ipo_list, workers=args.workers, sections_only=args.sections_only)
+
+if __name__ == '__main__':
+    main()
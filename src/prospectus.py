@@ -0,0 +1,208 @@
+import os
+import re
+import pandas as pd
+from io import BytesIO, StringIO
+from functools import cached_property, lru_cache
+from bs4 import BeautifulSoup
+from lxml import etree
+from sections import find_sections
+from html_text import count_words_and_chars, iter_text, read_chunks, split_chunks
+from file_reader import MappedDocument, read_document
+
+
+# Comments and tags in one alternation, re.split hands back text and tokens alternately
+html_token_pattern = re.compile(r'(<!--.*?-->|<[^>]+>)', re.DOTALL)
+special_token_pattern = re.compile(r'<!--[^\0]*-->(?=\0|$)|<!doctype[^\0]*')
+
+def normalize_special_token(match):
+    # Only whole tokens count, a comment opener inside a tag is left as it is
+    start = match.start()
+    if start > 0 and match.string[start - 1] != '\0':
+        return match.group(0)
+    return normalize_token(match.group(0))
+
+def normalize_tokens(tokens):
+    # All tags are lowercased in one call on a NUL separated string instead of one call per tag,
+    # then the rare comments and doctypes are fixed up
+    if not tokens:
+        return []
+    joined = '\0'.join(tokens).lower()
+    if '<!' in joined:
+        joined = special_token_pattern.sub(normalize_special_token, joined)
+    return joined.split('\0')
+
+def normalize_token(token):
+    if token.startswith('<!--') and token.endswith('-->') and len(token) >= 7:
+        return ''
+    if token[1:9].lower() == '!doctype':
+        return token.upper()
+    return token.lower()
+
+def normalize_html(html_content, out=None):
+    """Strip comments, lowercase tags and uppercase the doctype in a single scan of the document.
+
+    Writes into `out` (any object with `write`, e.g. a reused StringIO or an open file) when given
+    and returns it, otherwise returns the normalised string.
+    """
+    parts = html_token_pattern.split(html_content)
+    if '\0' in html_content:
+        parts[1::2] = [normalize_token(token) for token in parts[1::2]]
+    else:
+        parts[1::2] = normalize_tokens(parts[1::2])
+
+    if out is None:
+        return ''.join(parts)
+    out.writelines(parts)
+    return out
+
+
+def table_passes_prefilter(table, keywords_lower):
+    # Collapse whitespace the way pd.read_html does so multi-word keywords still match
+    table_text = ' '.join(''.join(table.itertext()).split()).lower()
+    return any(keyword in table_text for keyword in keywords_lower)
+
+def create_df_from_table_element(table):
+    try:
+        return pd.read_html(StringIO(etree.tostring(table, encoding='unicode', method='html')))[0]
+    except ValueError:
+        return None
+
+def iter_html_tables(html_content, keywords=None, encoding='utf-8'):
+    """Stream the <table> elements of a document one at a time as DataFrames.
+
+    `html_content` may be a string, bytes in `encoding`, or a binary file object such as a
+    memory-mapped document. Tables whose text contains none of `keywords` are skipped before any
+    DataFrame is built, and every element outside an open table is freed as soon as the parser is
+    done with it.
+    """
+    if isinstance(html_content, str):
+        html_content, encoding = html_content.encode('utf-8'), 'utf-8'
+    if isinstance(html_content, bytes):
+        html_content = BytesIO(html_content)
+    keywords_lower = [keyword.lower() for keyword in keywords] if keywords else None
+
+    events = etree.iterparse(html_content, events=('end',), html=True, recover=True, huge_tree=True, encoding=encoding)
+    for _, element in events:
+        if element.tag == 'table' and (keywords_lower is None or table_passes_prefilter(element, keywords_lower)):
+            df = create_df_from_table_element(element)
+            if df is not None:
+                yield df
+
+        # Nested elements belong to a table that is still being built, the outer table frees them
+        if next(element.iterancestors('table'), None) is not None:
+            continue
+
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+class ParsedProspectus:
+    """One SEC prospectus read from disk once, with every derived view built lazily and cached.
+
+    Extractors should ask for the view they need (`normalized_html`, `soup`, `text`,
+    `document_length`, `word_count`, or the streaming `iter_text` and `iter_tables`) instead of re-opening and re-parsing the file themselves, and
+    can narrow any of them to the named sections they care about with `section`.
+    """
+
+    def __init__(self, file_path, html=None):
+        self.file_path = file_path
+        self.section_views = {}
+
+        # A section view is built from a slice of its parent's html instead of the file
+        if html is not None:
+            self.html = html
+
+    @cached_property
+    def html(self):
+        # Decoded with the encoding the file declares or turns out to be in, not assumed utf-8
+        return read_document(self.file_path)
+
+    @cached_property
+    def normalized_html(self):
+        return normalize_html(self.html)
+
+    @cached_property
+    def soup(self):
+        soup = BeautifulSoup(self.html, 'html.parser')
+
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+
+        return soup
+
+    @cached_property
+    def soup_text(self):
+        # Raw text of the document, line breaks and spacing untouched
+        return self.soup.get_text()
+
+    def html_chunks(self):
+        # Stream from the file unless the html has already been read
+        if 'html' in self.__dict__:
+            return split_chunks(self.html)
+        return read_chunks(self.file_path)
+
+    def iter_text(self):
+        """Visible text in whitespace-normalised chunks, without building a soup."""
+        return iter_text(self.html_chunks())
+
+    @cached_property
+    def text(self):
+        return ''.join(self.iter_text())
+
+    def iter_tables(self, keywords=None):
+        if 'html' in self.__dict__:
+            return iter_html_tables(self.html, keywords)
+        return self.iter_file_tables(keywords)
+
+    def iter_file_tables(self, keywords=None):
+        # lxml reads the mapped bytes itself, the document is never decoded into a str
+        with MappedDocument(self.file_path) as document:
+            if not document.size:
+                return
+            yield from iter_html_tables(document.lxml_source(), keywords, document.lxml_encoding)
+
+    @cached_property
+    def sections(self):
+        # Section boundaries are found once per prospectus and shared by every extractor
+        return find_sections(self.html)
+
+    def section(self, names):
+        """A ParsedProspectus over only the named sections, or None when none of them were found."""
+        names = tuple(names)
+        if names not in self.section_views:
+            found = sorted((self.sections[name] for name in names if name in self.sections), key=lambda section: section.start)
+            html = '\n'.join(self.html[section.start:section.end] for section in found)
+            self.section_views[names] = ParsedProspectus(self.file_path, html) if found else None
+        return self.section_views[names]
+
+    @cached_property
+    def document_length(self):
+        return len(self.normalized_html)
+
+    @cached_property
+    def word_count(self):
+        # Constant memory: counted while streaming, the text itself is never materialised
+        return count_words_and_chars(self.html_chunks())[0]
+
+
+@lru_cache(maxsize=1)
+def cached_prospectus(file_path, mtime_ns, size):
+    return ParsedProspectus(file_path)
+
+def load_prospectus(file_path):
+    """Return the shared ParsedProspectus for a file so every stage in a run reuses one parse.
+
+    Only the last file is kept, and a file rewritten on disk gets a fresh parse.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return ParsedProspectus(file_path)
+    return cached_prospectus(file_path, stat.st_mtime_ns, stat.st_size)
+
+
+def prospectus_path(symbol, url):
+    file_name = url.split('/')[-1]
+    return f'./data/sec-ipo-files/{symbol}/{file_name}'
@@ -0,0 +1,110 @@
+import html
+import re
+from collections import namedtuple
+
+Section = namedtuple('Section', ['name', 'start', 'end'])
+
+# Standard prospectus headings, matched against a whole heading after lowercasing. Sections nobody
+# asks for are still listed so they end the section before them.
+SECTION_PATTERNS = [
+    ('summary_financial_data', r'summary (?:historical |selected )?(?:consolidated )?(?:financial|operating)(?: and (?:other|operating))?(?: data| information)'),
+    ('selected_financial_data', r'selected (?:historical )?(?:consolidated )?financial(?: and (?:other|operating))?(?: data| information)'),
+    ('financial_statements', r'index to (?:the )?(?:audited )?(?:consolidated )?financial statements'),
+    ('management', r'management|(?:our )?directors,? (?:and )?executive officers(?: and corporate governance)?|executive officers,? (?:and )?directors'),
+    ('principal_stockholders', r'principal (?:and selling )?(?:stockholders|shareholders)|security ownership of certain beneficial owners and management'),
+    ('underwriting', r'underwriting(?: \(conflicts? of interest\))?|underwriters|plan of distribution'),
+    ('summary', r'(?:prospectus )?summary'),
+    ('risk_factors', r'risk factors'),
+    ('use_of_proceeds', r'use of proceeds'),
+    ('dividend_policy', r'dividend policy'),
+    ('capitalization', r'capitalization'),
+    ('dilution', r'dilution'),
+    ('mdna', r"management[’']s discussion and analysis of financial condition and results of operations"),
+    ('business', r'(?:our )?business'),
+    ('executive_compensation', r'executive compensation|compensation discussion and analysis'),
+    ('related_party_transactions', r'certain relationships and related(?: party| person)? transactions'),
+    ('description_of_capital_stock', r'description of (?:capital stock|share capital|securities)'),
+    ('shares_eligible_for_future_sale', r'shares eligible for future sale'),
+    ('legal_matters', r'legal matters'),
+    ('experts', r'experts'),
+    ('where_you_can_find_more_information', r'where you can find (?:more|additional) information'),
+    ('part_ii', r'part ii|information not required in (?:the )?prospectus'),
+]
+heading_pattern = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in SECTION_PATTERNS))
+
+# Text between two tags short enough to be a heading, and table of contents links
+text_node_pattern = re.compile(r'>([^<>]{2,160})<')
+toc_link_pattern = re.compile(r'<a\b[^>]*\bhref\s*=\s*["\']#([^"\']+)["\'][^>]*>(.*?)</a\s*>', re.IGNORECASE | re.DOTALL)
+anchor_pattern = re.compile(r'<[^>]*\b(?:name|id)\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+tag_pattern = re.compile(r'<[^>]+>')
+
+# A heading this close to its neighbour is a table of contents row rather than the start of a section
+MIN_SECTION_CHARS = 2000
+
+def heading_name(text):
+    text = ' '.join(html.unescape(text).replace('\xa0', ' ').split()).strip(' .:').lower()
+    match = heading_pattern.fullmatch(text)
+    return match.lastgroup if match else None
+
+def heading_start(html_content, offset):
+    # Start the section at the tag holding the heading, not in the middle of it
+    tag_start = html_content.rfind('<', 0, offset)
+    return tag_start if tag_start != -1 else offset
+
+def find_heading_candidates(html_content):
+    candidates = []
+    for match in text_node_pattern.finditer(html_content):
+        name = heading_name(match.group(1))
+        if name is not None:
+            candidates.append((heading_start(html_content, match.start(1)), name))
+    return candidates
+
+def find_anchor_starts(html_content):
+    # Table of contents links point straight at the section, when the filing has them
+    anchors = {}
+    for match in anchor_pattern.finditer(html_content):
+        anchors.setdefault(match.group(1), match.start())
+
+    starts = {}
+    for match in toc_link_pattern.finditer(html_content):
+        name = heading_name(tag_pattern.sub('', match.group(2)))
+        if name is None or name in starts:
+            continue
+        target = anchors.get(match.group(1))
+        if target is not None and target > match.end():
+            starts[name] = target
+    return starts
+
+def drop_table_of_contents(candidates, min_chars=MIN_SECTION_CHARS):
+    """Drop headings that are table of contents rows: packed between two close neighbours, or close
+    to one neighbour while the same heading appears again later in the document."""
+    last_seen = {name: i for i, (_, name) in enumerate(candidates)}
+
+    kept = []
+    for i, (offset, name) in enumerate(candidates):
+        close_before = i > 0 and offset - candidates[i - 1][0] < min_chars
+        close_after = i + 1 < len(candidates) and candidates[i + 1][0] - offset < min_chars
+        repeated_later = last_seen[name] > i
+        if (close_before and close_after) or ((close_before or close_after) and repeated_later):
+            continue
+        kept.append((offset, name))
+    return kept
+
+def find_sections(html_content):
+    """Split a prospectus into named sections, returned as offsets into its html.
+
+    Section starts come from table of contents anchors where the filing has them, otherwise from the
+    first standalone heading of each section outside the table of contents. A section ends where the
+    next recognised section starts.
+    """
+    starts = find_anchor_starts(html_content)
+    candidates = drop_table_of_contents(find_heading_candidates(html_content))
+    for offset, name in candidates:
+        starts.setdefault(name, offset)
+
+    ordered = sorted((offset, name) for name, offset in starts.items())
+    sections = {}
+    for i, (offset, name) in enumerate(ordered):
+        end = ordered[i + 1][0] if i + 1 < len(ordered) else len(html_content)
+        sections[name] = Section(name, offset, end)
+    return sections
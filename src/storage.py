@@ -0,0 +1,96 @@
+import os
+import operator
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Parquet when pyarrow is installed, otherwise everything stays csv
+STORAGE_FORMAT = 'parquet' if HAS_PYARROW else 'csv'
+
+FILTER_OPS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    'in': lambda col, values: col.isin(values),
+    'not in': lambda col, values: ~col.isin(values),
+}
+
+def dataset_path(path, storage_format=None):
+    """Map a dataset name (with or without .csv/.parquet) to the file that backs it."""
+    base, ext = os.path.splitext(path)
+    if ext not in ('.csv', '.parquet'):
+        base = path
+    return f'{base}.{storage_format or STORAGE_FORMAT}'
+
+def existing_dataset_path(path):
+    # Prefer the columnar copy, fall back to csv for datasets that were never converted
+    for storage_format in (STORAGE_FORMAT, 'csv'):
+        candidate = dataset_path(path, storage_format)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def dataset_exists(path):
+    return existing_dataset_path(path) is not None
+
+def prepare_for_parquet(df):
+    df = df.copy()
+
+    # Parquet needs string column names, flattened MultiIndex headers arrive as tuples
+    df.columns = [str(col) for col in df.columns]
+
+    # Columns mixing numbers and text cannot be typed, store them as text like the csv did
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def write_dataset(df, path, export_csv=False):
+    file_path = dataset_path(path)
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+
+    if STORAGE_FORMAT == 'parquet':
+        prepare_for_parquet(df).to_parquet(file_path, index=False, engine='pyarrow', compression='zstd')
+    else:
+        df.to_csv(file_path, index=False)
+
+    # Csv copy only for final artifacts someone wants to open by hand
+    if export_csv and STORAGE_FORMAT != 'csv':
+        df.to_csv(dataset_path(path, 'csv'), index=False)
+
+    return file_path
+
+def apply_filters(df, filters):
+    for col, op, value in filters:
+        df = df[FILTER_OPS[op](df[col], value)]
+    return df
+
+def read_dataset(path, columns=None, filters=None):
+    """Read a dataset, optionally only some columns and only rows passing `filters`.
+
+    `filters` is a list of (column, op, value) tuples ANDed together, pushed down into the parquet
+    reader when the dataset is stored as parquet and applied after reading for csv.
+    """
+    file_path = existing_dataset_path(path)
+    if file_path is None:
+        print(f"File not found: {dataset_path(path)}")
+        return None
+
+    try:
+        if file_path.endswith('.parquet'):
+            return pd.read_parquet(file_path, columns=columns, filters=filters or None, engine='pyarrow')
+
+        # Filter columns must be read even when not projected
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys(list(columns) + [f[0] for f in filters or []]))
+        df = pd.read_csv(file_path, quotechar='"', low_memory=False, usecols=usecols)
+        if filters:
+            df = apply_filters(df, filters)
+        return df[columns] if columns is not None else df
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return None
@@ -0,0 +1,70 @@
+import os
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+CHUNK_ROWS = 100_000
+READ_WORKERS = 8
+
+def bounded_map(fn, items, workers=READ_WORKERS):
+    """Like executor.map over a thread pool, in order, but with at most 2 x workers results in
+    flight, so a slow consumer never lets the whole input pile up in memory."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def csv_columns(file_path):
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+def sum_file_counts(file_path, key, value, chunk_rows=CHUNK_ROWS):
+    counts = Counter()
+    for chunk in pd.read_csv(file_path, usecols=[key, value], chunksize=chunk_rows):
+        counts.update(chunk.groupby(key)[value].sum().to_dict())
+    return counts
+
+def sum_counts(files, key, value, chunk_rows=CHUNK_ROWS, workers=READ_WORKERS):
+    """Sum `value` per `key` over many csv files into one running Counter, a chunk at a time."""
+    totals = Counter()
+    for counts in bounded_map(lambda file_path: sum_file_counts(file_path, key, value, chunk_rows), files, workers):
+        totals.update(counts)
+    return totals
+
+def counts_to_frame(counts, key, value):
+    # Same order groupby().sum().sort_values() gave: by key, then by total. Keys are compared as
+    # text, csv chunks can leave ints, strings and NaN side by side and those do not order in Python
+    df = pd.DataFrame(sorted(counts.items(), key=lambda item: str(item[0])), columns=[key, value])
+    return df.sort_values(value, ascending=True)
+
+def write_csv_chunks(chunks, out_path, columns):
+    # Written under a temp name first so a crash never leaves a truncated output behind
+    tmp_path = f'{out_path}.tmp'
+    rows = 0
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+        pd.DataFrame(columns=columns).to_csv(file, index=False)
+        for chunk in chunks:
+            chunk.reindex(columns=columns).to_csv(file, index=False, header=False)
+            rows += len(chunk)
+    os.replace(tmp_path, out_path)
+    return rows
+
+def concat_csvs(files, out_path, workers=READ_WORKERS):
+    """pd.concat(files).to_csv(out_path) with only a few files in memory at once.
+
+    Headers are read first so every file is written under the union of the columns, in order of
+    first appearance, the way pd.concat aligns them. Files are read ahead on a thread pool while
+    earlier ones are written.
+    """
+    files = list(files)
+    columns = list(dict.fromkeys(column for file_columns in bounded_map(csv_columns, files, workers) for column in file_columns))
+    return write_csv_chunks(bounded_map(pd.read_csv, files, workers), out_path, columns)
+
+def drop_csv_columns(file_path, out_path, drop, chunk_rows=CHUNK_ROWS):
+    """Copy a csv without the columns in `drop`, which are never parsed at all."""
+    columns = [column for column in csv_columns(file_path) if column not in drop]
+    chunks = pd.read_csv(file_path, usecols=columns, chunksize=chunk_rows)
+    return write_csv_chunks(chunks, out_path, columns)
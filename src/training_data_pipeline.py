@@ -1,63 +1,161 @@
-from process_html import html_tables_to_csv, clean_html_file_and_stringify, clean_html_file_and_get_text
-from clean_csv import clean_out_columns_and_rows, locate_value_and_date, format_and_filter_rows, calculate_trend_and_recent, pivot_df
-from utils import create_df_from_csv
+from process_html import html_tables_to_csv, extraction_version
+from manifest import BuildManifest
+from prospectus import prospectus_path
+from document_metrics import add_document_metrics
+from corpus_index import CorpusIndex
+from clean_csv import clean_out_columns_and_rows, locate_value_and_date, format_and_filter_rows, calculate_trend_and_recent
+from clean_csv import calculate_document_length as calculate_filing_document_length
+from storage import dataset_exists, dataset_path, existing_dataset_path, read_dataset, write_dataset
+from cache import extraction_cache, code_version, hash_file
+import clean_csv
+import clean_polars
+import utils
 import pandas as pd
+import argparse
+import os
+
+def clean_financial_features(df, dir_name):
+    df = clean_out_columns_and_rows(df)
+    if df is None or df.columns.size == 0:
+        print(f'B: Could not clean out columns and rows for {dir_name},')
+        return None
+
+    df = locate_value_and_date(df) 
+    if df is None or df.columns.size == 0:
+        print(f'C: Could not locate value and date for {dir_name},')
+        return None
+    
+    df = format_and_filter_rows(df)
+    if df is None or df.columns.size == 0:
+        print(f'D: Could not format and filter rows for {dir_name},')
+        return None
 
-def create_training_dataset(ipo_list):
-    all_dfs = []
-    for tuple in list(ipo_list.itertuples(index=False)):
-        dir_name=tuple[0]
-        file_path= f'./data/sec-ipo-finance/{dir_name}/combined.csv';
+    df = calculate_trend_and_recent(df)
+    if df is None or df.columns.size == 0:
+        print(f'E: Could not calculate trend and recent for {dir_name},')
+        return None
 
-        df = create_df_from_csv(file_path)
-        if df is None or df.columns.size == 0:
-            print(f'A: Combined file not converted into a df for {dir_name},')
-            continue
-
-        df = clean_out_columns_and_rows(df)
-        if df is None or df.columns.size == 0:
-            print(f'B: Could not clean out columns and rows for {dir_name},')
-            continue
+    return df
 
-        df = locate_value_and_date(df) 
-        if df is None or df.columns.size == 0:
-            print(f'C: Could not locate value and date for {dir_name},')
-            continue
-        
-        df = format_and_filter_rows(df)
-        if df is None or df.columns.size == 0:
-            print(f'D: Could not format and filter rows for {dir_name},')
-            continue
+def cached_financial_features(file_path, dir_name):
+    # Cleaned features depend only on combined.csv and the cleaning code in clean_csv and utils
+    file_hash = hash_file(existing_dataset_path(file_path))
+    version = code_version(clean_csv, utils)
+    df = extraction_cache.get('features', file_hash, version)
+    if df is not None:
+        return df
+
+    df = read_dataset(file_path)
+    if df is None or df.columns.size == 0:
+        print(f'A: Combined file not converted into a df for {dir_name},')
+        return None
+
+    df = clean_financial_features(df, dir_name)
+    if df is not None:
+        extraction_cache.put('features', file_hash, version, df)
+    return df
 
-        df = calculate_trend_and_recent(df)
-        if df is None or df.columns.size == 0:
-            print(f'E: Could not calculate trend and recent for {dir_name},')
-            continue
+def create_training_dataset(ipo_list, incremental=False, engine='pandas'):
+    manifest = BuildManifest() if incremental else None
+    features_version = code_version(clean_csv, utils)
 
-        df = calculate_document_length(df, dir_name)
-        if df is None or df.columns.size == 0:
-            print(f'G: Could not calculate document length for {dir_name},')
-            continue
+    jobs = []
+    for tuple in list(ipo_list.itertuples(index=False)):
+        dir_name=tuple[0]
+        file_path= f'./data/sec-ipo-finance/{dir_name}/combined'
 
         # Convert tuple to dictionary
         row_dict = dict(zip(ipo_list.columns, tuple))
-        df = pivot_df(df)
-        if df is None or df.columns.size == 0:
-            print(f'F: Could not pivot df for {dir_name},')
+
+        # In incremental mode skip symbols whose inputs, ipo row and cleaning code are all unchanged
+        inputs = [dataset_path(file_path), prospectus_path(dir_name, row_dict['url'])]
+        version = code_version(features_version, row_dict)
+        if incremental and not manifest.is_stale(dir_name, 'clean_financial', inputs, version):
             continue
+        jobs.append((dir_name, file_path, row_dict, inputs, version))
+
+    load_features = financial_features_loader(engine, [job[0] for job in jobs if dataset_exists(job[1])])
 
-        # Add all columns from the current row
-        for col_name, value in row_dict.items():
-            df[col_name] = value
-        
-        df.to_csv(f'./data/sec-ipo-finance/{dir_name}/clean_financial.csv', index=False)
-        
-        all_dfs.append(df)
+    all_dfs = []
+    attempted = []
+    for dir_name, file_path, row_dict, inputs, version in jobs:
+        output_path = dataset_path(f'./data/sec-ipo-finance/{dir_name}/clean_financial')
+        attempted.append(dir_name)
+
+        df = build_clean_financial_row(file_path, dir_name, row_dict, load_features)
+        if df is None:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        else:
+            write_dataset(df, output_path)
+            all_dfs.append(df)
+
+        if incremental:
+            manifest.record(dir_name, 'clean_financial', inputs, version, [output_path])
+
+    if incremental:
+        manifest.save()
+        print(f'Rebuilt {len(attempted)} symbols, updating ./data/all_financial...')
+        update_combined_dataset(all_dfs, attempted, ipo_list['symbol'])
+        return
 
     print('Combining dataframes...') 
     all_dfs = pd.concat(all_dfs, axis=0)
-    all_dfs.to_csv(f'./data/all_financial.csv', index=False)
-    print('All financial data cleaned and saved to ./data/all_financial.csv')
+    file_path = write_dataset(all_dfs, './data/all_financial')
+    print(f'All financial data cleaned and saved to {file_path}')
+
+def financial_features_loader(engine, dir_names):
+    # The polars engine cleans every filing in one query up front, pandas cleans them one at a time as they are asked for
+    if engine == 'polars':
+        if clean_polars.HAS_POLARS:
+            features = clean_polars.financial_features(dir_names)
+            return lambda file_path, dir_name: features.get(dir_name)
+        print('polars is not installed, cleaning with pandas')
+    return cached_financial_features
+
+def build_clean_financial_row(file_path, dir_name, row_dict, load_features=cached_financial_features):
+    if not dataset_exists(file_path):
+        print(f'A: Combined file not converted into a df for {dir_name},')
+        return None
+
+    df = load_features(file_path, dir_name)
+    if df is None:
+        return None
+
+    df = calculate_filing_document_length(df, dir_name, row_dict['url'])
+    if df is None or df.columns.size == 0:
+        print(f'G: Could not calculate document length for {dir_name},')
+        return None
+
+    # Add all columns from the current row
+    for col_name, value in row_dict.items():
+        df[col_name] = value
+
+    return df
+
+def update_combined_dataset(new_dfs, rebuilt_symbols, symbols, file_path='./data/all_financial'):
+    frames = []
+
+    # Keep every row that was not rebuilt and still belongs to the ipo list
+    existing = read_dataset(file_path) if dataset_exists(file_path) else None
+    if existing is not None:
+        keep = ~existing['symbol'].isin(rebuilt_symbols) & existing['symbol'].isin(symbols)
+        frames.append(existing[keep])
+
+    frames.extend(new_dfs)
+    if not frames:
+        return
+
+    file_path = write_dataset(pd.concat(frames, axis=0), file_path)
+    print(f'All financial data updated in {file_path}')
+
+def stale_table_symbols(ipo_list, manifest, sections_only=False):
+    stale = []
+    for tuple in ipo_list.itertuples(index=False):
+        html_path = prospectus_path(tuple[0], tuple[1])
+        if manifest.is_stale(tuple[0], 'tables', [html_path], extraction_version(sections_only)):
+            stale.append(tuple[0])
+    return ipo_list[ipo_list['symbol'].isin(stale)]
 
 def combine_like_terms(df):
     df['cash_trend'].fillna(df['cash_and_cash_equivalents_trend'], inplace=True)
@@ -78,46 +176,69 @@ def join_keywords_with_financials(fin_df, keyword_df):
     return joined_df
 
 def clean_training_dataset():
-    df = create_df_from_csv("./data/all_financial.csv")
+    df = read_dataset("./data/all_financial")
     df = combine_like_terms(df)
     df = remove_mostly_nan_columns(df)
-    df.to_csv("./data/all_financial_reduced.csv", index=False)
-
-# def main():
-#     # Gather file locations to process into a dataframe
-#     ipo_list = create_df_from_csv('./datasets/keyword_analysis_with_url.csv')
-#     ipo_list = ipo_list[['symbol', 'url']]
-#     ipo_list['url'] = ipo_list['url'].apply(lambda x: x.split('/')[-1])
-
-#     # Extract html tables related to financial from raw/dirty SEC ipo prospectus files into csv files
-#     html_tables_to_csv(ipo_list)
-
-#     # Create training dataset from those csv files
-#     create_training_dataset(ipo_list)
-
-#     # Clean training dataset
-#     clean_training_dataset()
-
-
-def calculate_word_count(row):
-    file_name = row['url'].split('/')[-1]
-    file_path = f'./data/sec-ipo-files/{row["symbol"]}/{file_name}'
-    text_content = clean_html_file_and_get_text(file_path)
-    
-    # Count words (split by whitespace)
-    word_count = len(text_content.split())
-    return word_count
-
-def calculate_document_length(row):
-    file_name = row['url'].split('/')[-1]
-    file_path = f'./data/sec-ipo-files/{row["symbol"]}/{file_name}'
-    html_content = clean_html_file_and_stringify(file_path)
-    return len(html_content)
+    write_dataset(df, "./data/all_financial_reduced", export_csv=True)
+
+def build_training_dataset(incremental=False, workers=1, engine='pandas', sections_only=False):
+    # Gather file locations to process into a dataframe
+    ipo_list = read_dataset('./datasets/keyword_analysis_with_url', columns=['symbol', 'url'])
+    ipo_list = ipo_list[['symbol', 'url']]
+    ipo_list['url'] = ipo_list['url'].apply(lambda x: x.split('/')[-1])
+
+    # Filings that are not on disk are dropped up front instead of failing one by one in the workers.
+    # The refresh is one scandir and a stat compare, only new or changed files are hashed
+    with CorpusIndex() as corpus:
+        corpus.update()
+        on_disk = corpus.paths(ipo_list).notna()
+    print(f'{on_disk.sum()} of {len(ipo_list)} filings found in the corpus index')
+    ipo_list = ipo_list[on_disk]
+
+    # Extract html tables related to financial from raw/dirty SEC ipo prospectus files into csv files
+    if incremental:
+        manifest = BuildManifest()
+        stale = stale_table_symbols(ipo_list, manifest, sections_only)
+        print(f'{len(stale)} of {len(ipo_list)} filings need their tables extracted')
+        saved, _ = html_tables_to_csv(stale, workers=workers, sections_only=sections_only)
+        saved = set(saved)
+        for tuple in stale.itertuples(index=False):
+            # Failed or empty extractions are left unrecorded so the next incremental run retries them
+            combined_path = dataset_path(f'./data/sec-ipo-finance/{tuple[0]}/combined')
+            if tuple[0] not in saved or not os.path.exists(combined_path):
+                continue
+            html_path = prospectus_path(tuple[0], tuple[1])
+            manifest.record(tuple[0], 'tables', [html_path], extraction_version(sections_only), [combined_path])
+        manifest.save()
+    else:
+        html_tables_to_csv(ipo_list, workers=workers, sections_only=sections_only)
+
+    # Create training dataset from those csv files
+    create_training_dataset(ipo_list, incremental=incremental, engine=engine)
+
+    # Clean training dataset
+    clean_training_dataset()
+
+
+def add_document_metrics_to_dataset(workers=None):
+    df = read_dataset("./datasets/all_financial_with_keywords")
+    # Length and word count come from one streaming pass per filing, cached by file hash
+    df = add_document_metrics(df, workers=workers)
+    write_dataset(df, "./datasets/all_financial_with_keywords_test", export_csv=True)
 
 def main():
-    df = create_df_from_csv("./datasets/all_financial_with_keywords.csv")
-    df['document_length'] = df.apply(calculate_document_length, axis=1)
-    df['word_count'] = df.apply(calculate_word_count, axis=1)
-    df.to_csv("./datasets/all_financial_with_keywords_test.csv", index=False)
-
-main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Build the financial training dataset from SEC ipo prospectus files')
+    parser.add_argument('--build', action='store_true', help='run the extraction and cleaning pipeline instead of only adding document metrics')
+    parser.add_argument('--incremental', action='store_true', help='only rebuild symbols whose inputs or code changed since the last build')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for html table extraction and document metrics, defaults to 1 for extraction and every cpu for metrics')
+    parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas', help='clean the combined tables one filing at a time with pandas, or all at once in one polars query')
+    parser.add_argument('--sections-only', action='store_true', help='look for finance tables only in the sections that hold them, changes the tables found compared with a whole document scan')
+    args = parser.parse_args()
+
+    if args.build:
+        build_training_dataset(incremental=args.incremental, workers=args.workers or 1, engine=args.engine, sections_only=args.sections_only)
+    else:
+        add_document_metrics_to_dataset(workers=args.workers)
+
+if __name__ == '__main__':
+    main()
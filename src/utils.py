@@ -7,17 +7,46 @@ DATE_PATTERNS = [
     r'\b\d{4}[-/]\d{1,2}[-/]\d{1,2}\b',       # YYYY/MM/DD, YYYY-MM-DD
     
     # Full month names
-    r'\b(January|February|March|April|May|June|July|August|September|October|November|December)\s*\d{1,2},?\s*\d{4}\b',  # Month DD, YYYY
-    r'\b\d{1,2}\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{2,4}\b',  # DD Month YYYY
+    r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s*\d{1,2},?\s*\d{4}\b',  # Month DD, YYYY
+    r'\b\d{1,2}\s+(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{2,4}\b',  # DD Month YYYY
     
     # "For the year ended..." formats
-    r'For\s+the\s+.*?ended\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s*\d{1,2},?\s*\d{4}',
+    r'For\s+the\s+.*?ended\s+(?:January|February|March|April|May|June|July|August|September|October|November|December)\s*\d{1,2},?\s*\d{4}',
     
     # Abbreviated months
-    r'\b\d{1,2}\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.?\s+\d{2,4}\b',  # DD Month YYYY
-    r'\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.?\s+\d{1,2},?\s+\d{2,4}\b',  # Month DD, YYYY
+    r'\b\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.?\s+\d{2,4}\b',  # DD Month YYYY
+    r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.?\s+\d{1,2},?\s+\d{2,4}\b',  # Month DD, YYYY
 ]
 
+MONTHS = r'(?:January|February|March|April|May|June|July|August|September|October|November|December)'
+
+# Pattern registry: every regex used by the parsers below, compiled once at import
+PATTERNS = {
+    # Any of the date patterns, one alternation
+    'date': re.compile('|'.join(DATE_PATTERNS), re.IGNORECASE),
+
+    # Date extraction, "Month DD, YYYY" wins over "DD Month YYYY" wherever both appear
+    'month_day_year': re.compile(rf'(?P<month>{MONTHS})\s*(?P<day>\d{{1,2}}),?\s*(?P<year>\d{{4}})', re.IGNORECASE),
+    'day_month_year': re.compile(rf'\b(?P<day>\d{{1,2}})\s+(?P<month>{MONTHS})\s+(?P<year>\d{{2,4}})\b', re.IGNORECASE),
+
+    # $(21.94) - dollar sign with parentheses
+    # $46,624 - dollar sign with commas
+    # (631) - just parentheses
+    'number': re.compile(
+        r'(?:\$\((?P<dollar_parens>[0-9,]+(?:\.[0-9]+)?)\)'
+        r'|\$(?P<dollar>[0-9,]+(?:\.[0-9]+)?)'
+        r'|^\((?P<parens>[0-9,]+(?:\.[0-9]+)?)\)$'
+        r'|^(?P<plain>[0-9,]+(?:\.[0-9]+)?)$)'
+    ),
+
+    # snake_case conversion steps
+    'parenthesised': re.compile(r'\([^)]*\)'),
+    'apostrophe': re.compile(r"[\']"),
+    'separator': re.compile(r'[-\s]+'),
+    'camel_boundary': re.compile(r'([a-z])([A-Z])'),
+    'underscores': re.compile(r'_+'),
+}
+
 def create_df_from_html_file(file_path):
     try:
         df = pd.read_html(file_path)
@@ -63,9 +92,8 @@ def is_date_in_row(row):
             
         col_str = str(col).replace('  ', ' ')
         
-        for pattern in DATE_PATTERNS:
-            if re.search(pattern, col_str, re.IGNORECASE):
-                return True
+        if PATTERNS['date'].search(col_str):
+            return True
     
     return False
 
@@ -89,27 +117,10 @@ def regex_format_date(text):
     if not isinstance(text, str):
         return None
 
-    # Extraction patterns with capture groups
-    extraction_patterns = [
-        r"(January|February|March|April|May|June|July|August|September|October|November|December)\s*(\d{1,2}),?\s*(\d{4})",
-        r"For\s+the\s+.*?ended\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s*(\d{1,2}),?\s*(\d{4})",
-        r".*?(January|February|March|April|May|June|July|August|September|October|November|December)\s*(\d{1,2}),?\s*(\d{4})",
-        r"\b(\d{1,2})\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{2,4})\b",  # DD Month YYYY
-    ]
-
-    
-    for pattern in extraction_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in (PATTERNS['month_day_year'], PATTERNS['day_month_year']):
+        match = pattern.search(text)
         if match:
-            groups = match.groups()
-            if len(groups) >= 3:
-                # Handle different group orders
-                if groups[0].isdigit():  # DD Month YYYY format
-                    day, month, year = groups[:3]
-                    return f"{month} {day}, {year}"
-                else:  # Month DD, YYYY format
-                    month, day, year = groups[:3]
-                    return f"{month} {day}, {year}"
+            return f"{match['month']} {match['day']}, {match['year']}"
     
     return None
 
@@ -117,17 +128,11 @@ def regex_format_number(text):
     if not isinstance(text, str):
         return None
     
-    # $(21.94) - dollar sign with parentheses
-    # $46,624 - dollar sign with commas
-    # (631) - just parentheses
-    # More specific patterns for each format
-    pattern = r'(?:\$\(([0-9,]+(?:\.[0-9]+)?)\)|\$([0-9,]+(?:\.[0-9]+)?)|^\(([0-9,]+(?:\.[0-9]+)?)\)$|^([0-9,]+(?:\.[0-9]+)?)$)'
-    
-    match = re.search(pattern, text)
+    match = PATTERNS['number'].search(text)
     
     if match:
         # Get the matched number (one of the groups will be non-None)
-        number_str = next((g for g in match.groups() if g), None)
+        number_str = next((g for g in match.groupdict().values() if g), None)
         
         if number_str:
             number_str = number_str.replace(',', '')
@@ -144,20 +149,79 @@ def regex_format_number(text):
     
     return None
 
+def parse_distinct(series, parse):
+    # Table cells repeat the same text over and over, so run the regexes once per distinct value
+    codes, uniques = pd.factorize(series)
+    parsed = parse(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    values = pd.Series(parsed[codes], index=series.index, dtype=object)
+    return values.where(codes != -1)
+
+def string_cells(series):
+    # Only real strings go through the regexes, numbers and NaN are left to the caller
+    return series[series.map(type).eq(str)].astype(str)
+
+def contains_date(series):
+    """Vectorised is_date_in_row for one cell per element: True where the text holds a date."""
+    def parse(cells):
+        return cells.astype(str).str.replace('  ', ' ', regex=False).str.contains(PATTERNS['date'])
+    return parse_distinct(series, parse).eq(True)
+
+def format_dates(series):
+    """Vectorised regex_format_date: "Month DD, YYYY" for string cells, NaN where no date is found."""
+    def parse(cells):
+        text = string_cells(cells)
+        month_day_year = text.str.extract(PATTERNS['month_day_year'])
+        day_month_year = text.str.extract(PATTERNS['day_month_year'])[['month', 'day', 'year']]
+
+        parts = month_day_year.where(month_day_year['month'].notna(), day_month_year)
+        dates = parts['month'] + ' ' + parts['day'] + ', ' + parts['year']
+        return dates.reindex(cells.index)
+    return parse_distinct(series, parse)
+
+def format_numbers(series):
+    """Vectorised regex_format_number: parsed float for string cells, NaN where nothing parses."""
+    def parse(cells):
+        text = string_cells(cells)
+        # Kept as objects, an extract without any match would otherwise come back as all-NaN floats
+        groups = text.str.extract(PATTERNS['number']).astype(object)
+
+        # Exactly one group matches, take the one that did
+        number_str = groups['dollar_parens'].combine_first(groups['dollar']).combine_first(groups['parens']).combine_first(groups['plain'])
+        numbers = pd.to_numeric(number_str.str.replace(',', '', regex=False), errors='coerce').astype(float)
+
+        # Negative when wrapped in parentheses
+        is_negative = text.str.contains('(', regex=False) & text.str.contains(')', regex=False)
+        numbers = numbers.where(~is_negative, -numbers)
+        return numbers.reindex(cells.index)
+    return parse_distinct(series, parse).astype(float)
+
 def to_snake_case(text):
     """Convert text to snake_case format"""
     # Remove parentheses and their contents
-    text = re.sub(r'\([^)]*\)', '', text)
-    # Remove apostrophes (both regular and Unicode variants)
-    text = re.sub(r"['']", '', text)  # Handles both ' and '
+    text = PATTERNS['parenthesised'].sub('', text)
+    # Remove apostrophes
+    text = PATTERNS['apostrophe'].sub('', text)
     # Replace spaces, hyphens, and other separators with underscores
-    text = re.sub(r'[-\s]+', '_', text)
+    text = PATTERNS['separator'].sub('_', text)
     # Insert underscore before uppercase letters that follow lowercase letters
-    text = re.sub(r'([a-z])([A-Z])', r'\1_\2', text)
+    text = PATTERNS['camel_boundary'].sub(r'\1_\2', text)
     # Convert to lowercase
     text = text.lower()
     # Remove multiple underscores
-    text = re.sub(r'_+', '_', text)
+    text = PATTERNS['underscores'].sub('_', text)
     # Remove leading/trailing underscores
     text = text.strip('_')
-    return text
\ No newline at end of file
+    return text
+
+def format_snake_case(series):
+    """Vectorised to_snake_case over a Series of strings"""
+    def parse(names):
+        return (names
+                .str.replace(PATTERNS['parenthesised'], '', regex=True)
+                .str.replace(PATTERNS['apostrophe'], '', regex=True)
+                .str.replace(PATTERNS['separator'], '_', regex=True)
+                .str.replace(PATTERNS['camel_boundary'], r'\1_\2', regex=True)
+                .str.lower()
+                .str.replace(PATTERNS['underscores'], '_', regex=True)
+                .str.strip('_'))
+    return parse_distinct(series, parse)
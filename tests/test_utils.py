@@ -0,0 +1,27 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from utils import format_numbers, regex_format_number
+from clean_csv import locate_value_and_date
+
+def test_format_numbers_without_any_parseable_number():
+    series = pd.Series(['abc', 'n/a', '—'], dtype=object)
+    result = format_numbers(series)
+    assert result.dtype == float
+    assert result.isna().all()
+
+def test_format_numbers_mixed_object_and_int_column():
+    series = pd.Series(['abc', 5, '$46,624', '(631)', np.nan], dtype=object)
+    expected = [regex_format_number(cell) for cell in series]
+    result = format_numbers(series)
+    # Only string cells are parsed, the int and the NaN are left to the caller
+    assert expected == [None, None, 46624.0, -631.0, None]
+    assert result.tolist()[2:4] == [46624.0, -631.0]
+    assert result.iloc[[0, 1, 4]].isna().all()
+
+def test_locate_value_and_date_with_no_number_strings():
+    df = pd.DataFrame({'0': ['Revenue', 'Cash'], '1': ['December 31, 2020', 'abc'], '2': [5, 7]})
+    assert locate_value_and_date(df).empty